@@ -0,0 +1,33 @@
+from functools import lru_cache
+
+import pygame
+
+from constants import *
+
+# Most rendered strings kept around for reuse
+TEXT_CACHE_SIZE = 256
+
+
+@lru_cache(maxsize=None)
+def get_font(path: str = FONT_PATH, size: int = 24) -> pygame.font.Font:
+    # Load each font file once per size, starting the font module the first time one is needed
+    if not pygame.font.get_init():
+        pygame.font.init()
+    return pygame.font.Font(path, size)
+
+
+@lru_cache(maxsize=TEXT_CACHE_SIZE)
+def render_text(text: str, size: int = 24, color: tuple = WHITE, path: str = FONT_PATH) -> pygame.Surface:
+    # Rendered text, shared between callers so it must not be drawn onto
+    return get_font(path, size).render(text, True, color)
+
+
+def blit_glyphs(screen, text: str, position, size: int = 24, color: tuple = WHITE, path: str = FONT_PATH) -> int:
+    # Draw text one cached character at a time, for fast changing numbers that would
+    # otherwise need a new render every frame. Returns the x position after the text.
+    x, y = position
+    for character in text:
+        glyph = render_text(character, size, color, path)
+        screen.blit(glyph, (x, y))
+        x += glyph.get_width()
+    return x
@@ -0,0 +1,233 @@
+import numpy as np
+
+from constants import *
+from game_state import MOVE_LEFT, MOVE_RIGHT, SOFT_DROP, ROTATE, HOLD, HARD_DROP, DEFAULT_GRAVITY
+from randomizer import PREVIEW_LENGTH, TETROMINO_TYPES
+from tetromino import ROTATION_STATES, SPAWN_ORIGINS
+
+# Types are indexed in TETROMINO_TYPES order, boards store a placed cell as its type index + 1
+O_PIECE = TETROMINO_TYPES.index('O')
+NO_PIECE = -1
+
+
+# The rotation tables as arrays: (type, rotation, tile, (column, row)) offsets of every tile
+# from the rotation origin, (type, rotation, kick, (column, row)) rotation kicks and the
+# origin every type spawns at
+PIECE_OFFSETS = np.array([[orientation.cells for orientation in ROTATION_STATES[tetromino_type]]
+                          for tetromino_type in TETROMINO_TYPES], dtype=np.int64)
+MAX_KICKS = max(len(orientation.kicks) for states in ROTATION_STATES.values() for orientation in states)
+# Shorter kick lists are padded by retrying the rotation in place, which can't succeed the second time
+PIECE_KICKS = np.array([[orientation.kicks + ((0, 0),) * (MAX_KICKS - len(orientation.kicks))
+                         for orientation in ROTATION_STATES[tetromino_type]]
+                        for tetromino_type in TETROMINO_TYPES], dtype=np.int64)
+PIECE_SPAWNS = np.array([SPAWN_ORIGINS[tetromino_type] for tetromino_type in TETROMINO_TYPES], dtype=np.int64)
+
+
+class BatchedEnv:
+    def __init__(self, num_boards: int, seed=None, dt: float = 1000 / 60,
+                 columns: int = BOARD_COLUMNS, rows: int = BOARD_ROWS, gravity=DEFAULT_GRAVITY):
+        self.num_boards = num_boards
+        self.gravity = gravity
+        self.columns = columns
+        self.rows = rows
+        self.dt = dt  # Milliseconds simulated by each step
+        self.rng = np.random.default_rng(seed)
+        self.boards = np.zeros((num_boards, rows, columns), dtype=np.uint8)
+        # The falling piece of every board
+        self.piece_type = np.zeros(num_boards, dtype=np.int64)
+        self.rotation = np.zeros(num_boards, dtype=np.int64)
+        self.origin_x = np.zeros(num_boards, dtype=np.int64)
+        self.origin_y = np.zeros(num_boards, dtype=np.int64)
+        self.is_placed = np.zeros(num_boards, dtype=bool)
+        # Held and upcoming pieces
+        self.held_type = np.full(num_boards, NO_PIECE, dtype=np.int64)
+        self.held_is_placed = np.zeros(num_boards, dtype=bool)
+        self.using_held_piece = np.zeros(num_boards, dtype=bool)
+        self.upcoming = np.zeros((num_boards, PREVIEW_LENGTH), dtype=np.int64)
+        # Score, counters and tick tracking
+        self.score = np.zeros(num_boards, dtype=np.int64)
+        self.lines_cleared = np.zeros(num_boards, dtype=np.int64)
+        self.tetrominos_placed = np.zeros(num_boards, dtype=np.int64)
+        self.tick_speed = np.zeros(num_boards)
+        self.prior_elapsed = np.zeros(num_boards)
+        self.time_elapsed = np.zeros(num_boards)
+        self.place_block_timer = np.zeros(num_boards)
+        # Lines cleared on each board during the latest step
+        self.step_lines = np.zeros(num_boards, dtype=np.int64)
+        self.done = np.zeros(num_boards, dtype=bool)
+        self.reset()
+
+    def next_types(self, count: int) -> np.ndarray:
+        # Random tetromino types for newly generated pieces
+        return self.rng.integers(0, len(TETROMINO_TYPES), size=count)
+
+    def reset(self, indices=None) -> None:
+        # Start new games on the given boards (all boards by default)
+        if indices is None:
+            indices = np.arange(self.num_boards)
+        indices = np.asarray(indices)
+        if indices.dtype == bool:
+            indices = np.flatnonzero(indices)
+        self.boards[indices] = 0
+        types = self.next_types(len(indices) * (PREVIEW_LENGTH + 1)).reshape(PREVIEW_LENGTH + 1, len(indices))
+        self.spawn(indices, types[0])
+        self.upcoming[indices] = types[1:].T
+        self.held_type[indices] = NO_PIECE
+        self.held_is_placed[indices] = False
+        self.using_held_piece[indices] = False
+        self.score[indices] = 0
+        self.lines_cleared[indices] = 0
+        self.tetrominos_placed[indices] = 0
+        self.tick_speed[indices] = self.gravity.base
+        self.prior_elapsed[indices] = 0
+        self.time_elapsed[indices] = 1
+        self.place_block_timer[indices] = 0
+        self.done[indices] = False
+
+    def spawn(self, indices, types) -> None:
+        self.piece_type[indices] = types
+        self.rotation[indices] = 0
+        self.origin_x[indices] = PIECE_SPAWNS[types, 0]
+        self.origin_y[indices] = PIECE_SPAWNS[types, 1]
+        self.is_placed[indices] = False
+
+    def next_from_queue(self, indices) -> None:
+        # Take a tetromino off the queue and put a new tetromino on the back of it
+        self.spawn(indices, self.upcoming[indices, 0])
+        self.upcoming[indices, :-1] = self.upcoming[indices, 1:]
+        self.upcoming[indices, -1] = self.next_types(len(indices))
+
+    def piece_cells(self, indices, rotation=None, offset_x=0, offset_y=0):
+        # (columns, rows) of the falling pieces' tiles, each shaped (len(indices), 4)
+        if rotation is None:
+            rotation = self.rotation[indices]
+        offsets = PIECE_OFFSETS[self.piece_type[indices], rotation]
+        columns = self.origin_x[indices, None] + offset_x + offsets[..., 0]
+        rows = self.origin_y[indices, None] + offset_y + offsets[..., 1]
+        return columns, rows
+
+    def fits(self, indices, rotation=None, offset_x=0, offset_y=0) -> np.ndarray:
+        # Whether each piece would be inside its board and clear of placed tiles
+        columns, rows = self.piece_cells(indices, rotation, offset_x, offset_y)
+        inside = (columns >= 0) & (columns < self.columns) & (rows >= 0) & (rows < self.rows)
+        cells = self.boards[indices[:, None], rows.clip(0, self.rows - 1), columns.clip(0, self.columns - 1)]
+        return (inside & (cells == 0)).all(axis=1)
+
+    def drop_distance(self, indices) -> np.ndarray:
+        # How many rows each piece can fall before landing: the smallest gap between
+        # one of its tiles and the first placed tile or the floor below it
+        columns, rows = self.piece_cells(indices)
+        stacks = self.boards[indices[:, None], :, columns] != 0
+        below = stacks & (np.arange(self.rows) > rows[..., None])
+        landing = np.where(below.any(axis=2), below.argmax(axis=2), self.rows)
+        return (landing - rows - 1).min(axis=1)
+
+    def move_down(self, indices) -> None:
+        # Move pieces down if possible, otherwise place them
+        can_move_down = self.fits(indices, offset_y=1)
+        self.origin_y[indices[can_move_down]] += 1
+        self.is_placed[indices[~can_move_down]] = True
+
+    def shift(self, indices, offset_x) -> None:
+        can_shift = self.fits(indices, offset_x=offset_x)
+        self.origin_x[indices[can_shift]] += offset_x
+
+    def step(self, actions, dt=None):
+        # Apply one action per live board, advance them by dt milliseconds
+        # and return the (rewards, lines cleared, done) arrays
+        dt = self.dt if dt is None else dt
+        actions = np.asarray(actions)
+        prior_score = self.score.copy()
+        self.step_lines[:] = 0
+        live = np.flatnonzero(~self.done)
+        self.apply(live, actions[live])
+        self.update(live, dt)
+        # Check if the games are over
+        self.done[live] = self.boards[live, :TOP_OUT_ROWS].any(axis=(1, 2))
+        return self.score - prior_score, self.step_lines.copy(), self.done.copy()
+
+    def update(self, live, dt: float) -> None:
+        # Place a piece when the timer runs out
+        grounded = ~self.fits(live, offset_y=1)
+        timer = self.place_block_timer[live]
+        running_out = grounded & (timer < self.tick_speed[live])
+        timed_out = grounded & ~running_out
+        timer[~grounded | timed_out] = 0
+        timer[running_out] += dt
+        self.place_block_timer[live] = timer
+        self.is_placed[live[timed_out]] = True
+        # Generate next piece when current is placed
+        self.lock(live[self.is_placed[live]])
+        # Adjust the tick speed to the score
+        self.tick_speed[live] = np.maximum(self.gravity.base - self.gravity.ramp * self.score[live],
+                                           self.gravity.minimum)
+        # Game ticks -> Tetromino moves down
+        self.time_elapsed[live] += dt
+        ticked = live[self.time_elapsed[live] > self.prior_elapsed[live] + self.tick_speed[live]]
+        self.move_down(ticked)
+        self.prior_elapsed[ticked] = self.time_elapsed[ticked]
+
+    def lock(self, indices) -> None:
+        # Write the placed pieces into their boards and spawn the next ones
+        columns, rows = self.piece_cells(indices)
+        self.boards[indices[:, None], rows, columns] = self.piece_type[indices, None] + 1
+        self.remove_lines(indices)
+        self.tetrominos_placed[indices] += 1
+        self.using_held_piece[indices] = False
+        self.next_from_queue(indices)
+
+    def apply(self, live, actions) -> None:
+        # PLACE PIECE BELOW
+        dropping = live[(actions == HARD_DROP) & ~self.is_placed[live]]
+        self.origin_y[dropping] += self.drop_distance(dropping)
+        self.is_placed[dropping] = True
+        # TURN PIECE, trying each kick in turn
+        turning = live[(actions == ROTATE) & (self.piece_type[live] != O_PIECE)]
+        for kick in range(MAX_KICKS):
+            offset = PIECE_KICKS[self.piece_type[turning], self.rotation[turning], kick]
+            rotation = (self.rotation[turning] + 1) % 4
+            can_rotate = self.fits(turning, rotation, offset[:, :1], offset[:, 1:])
+            rotated = turning[can_rotate]
+            self.rotation[rotated] = rotation[can_rotate]
+            self.origin_x[rotated] += offset[can_rotate, 0]
+            self.origin_y[rotated] += offset[can_rotate, 1]
+            turning = turning[~can_rotate]
+        # HOLD PIECE
+        self.hold(live[(actions == HOLD) & ~self.using_held_piece[live]])
+        # DIRECTIONAL MOVEMENT
+        self.move_down(live[actions == SOFT_DROP])
+        self.shift(live[actions == MOVE_RIGHT], 1)
+        self.shift(live[actions == MOVE_LEFT], -1)
+
+    def hold(self, indices) -> None:
+        self.using_held_piece[indices] = True
+        empty = self.held_type[indices] == NO_PIECE
+        # Hold a piece and refill the queue
+        holding = indices[empty]
+        self.held_type[holding] = self.piece_type[holding]
+        self.held_is_placed[holding] = self.is_placed[holding]
+        self.next_from_queue(holding)
+        # Use the held piece from its default position and make the held slot empty again
+        swapping = indices[~empty]
+        is_placed = self.held_is_placed[swapping]
+        self.spawn(swapping, self.held_type[swapping])
+        self.is_placed[swapping] = is_placed
+        self.held_type[swapping] = NO_PIECE
+
+    def remove_lines(self, indices) -> None:
+        boards = self.boards[indices]
+        full_rows = (boards != 0).all(axis=2)
+        count = full_rows.sum(axis=1)
+        cleared = np.flatnonzero(count)
+        if len(cleared) == 0:
+            return
+        boards, full_rows, count = boards[cleared], full_rows[cleared], count[cleared]
+        # Move the full rows to the top, keeping the order of the others, then empty them
+        order = np.argsort(~full_rows, axis=1, kind='stable')
+        boards = np.take_along_axis(boards, order[:, :, None], axis=1)
+        boards[np.arange(self.rows) < count[:, None]] = 0
+        self.boards[indices[cleared]] = boards
+        # Increment the score (tetris is bonus points)
+        self.score[indices[cleared]] += np.where(count == 4, POINTS_PER_TETRIS, POINTS_PER_LINE * count)
+        self.lines_cleared[indices[cleared]] += count
+        self.step_lines[indices[cleared]] += count
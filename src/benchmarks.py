@@ -0,0 +1,222 @@
+import argparse
+import copy
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+import timeit
+
+# Render off-screen
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+
+import pygame
+
+from constants import *
+from board import TYPE_CODES
+from game_state import *
+from renderer import BOARD_ORIGIN, Renderer, draw_grid
+
+# How full the synthetic boards are, as the fraction of the rows below the top-out rows that hold tiles
+FILL_LEVELS = {
+    'empty': 0.0,
+    'half': 0.5,
+    'near_topout': 1.0,
+}
+# Code run in a fresh interpreter for each startup benchmark, printing the seconds it took
+STARTUP_SCRIPTS = {
+    # The engine alone, as a headless tool or test imports it
+    'import_engine': 'import time; start = time.perf_counter(); import game_state; '
+                     'print(time.perf_counter() - start)',
+    # Everything the game needs, without opening the window
+    'import_game': 'import time; start = time.perf_counter(); import run_tetris; '
+                   'print(time.perf_counter() - start)',
+    # From launching the interpreter to the first frame of the title screen being shown, the
+    # launch time (a wall clock shared between processes) being passed in as the first argument
+    'first_frame': 'import sys, time; import run_tetris; run_tetris.main(frames=1); '
+                   'print(time.time() - float(sys.argv[1]))',
+}
+# Milliseconds the first frame may take to appear before the run counts as failed
+FIRST_FRAME_BUDGET = 500
+
+
+def fill_state(state, fill: float, rng) -> None:
+    # Stack rows of tiles on the board from the bottom up, leaving one gap per row so no line is full
+    filled_rows = round(fill * (state.board.rows - TOP_OUT_ROWS - 1))
+    codes = list(TYPE_CODES.values())
+    for row in range(state.board.rows - filled_rows, state.board.rows):
+        gap = rng.randrange(state.board.columns)
+        for column in range(state.board.columns):
+            if column != gap:
+                state.board.add_cell(column, row, rng.choice(codes))
+
+
+def make_state(fill: float, seed: int = 0) -> GameState:
+    state = GameState(seed)
+    fill_state(state, fill, random.Random(seed))
+    return state
+
+
+def complete_lines(state, lines: int = 4) -> list[int]:
+    # Fill in the gaps of the bottom rows so that they clear, returning those rows
+    rows = list(range(state.board.rows - lines, state.board.rows))
+    for row in rows:
+        for column in range(state.board.columns):
+            if not state.board.is_occupied(column, row):
+                state.board.add_cell(column, row)
+    return rows
+
+
+def time_call(function, repeat: int, setup=None) -> dict:
+    # Seconds per call of the function. With a setup function, every call gets a fresh
+    # argument from it and only the calls themselves are timed.
+    if setup is None:
+        timer = timeit.Timer(function)
+        number, _ = timer.autorange()
+        runs = [elapsed / number for elapsed in timer.repeat(repeat, number)]
+    else:
+        number = 100
+        runs = []
+        for _ in range(repeat):
+            arguments = [setup() for _ in range(number)]
+            start = time.perf_counter()
+            for argument in arguments:
+                function(argument)
+            runs.append((time.perf_counter() - start) / number)
+    runs.sort()
+    return {'calls': number * repeat, 'best_us': runs[0] * 1e6, 'median_us': runs[len(runs) // 2] * 1e6}
+
+
+def engine_benchmarks(state) -> dict:
+    board = state.board
+    current = state.current_tetromino
+
+    def move_sideways():
+        current.move_left(board)
+        current.move_right(board)
+
+    def fresh_line_clear():
+        cleared = copy.deepcopy(state)
+        return cleared, complete_lines(cleared)
+
+    return {
+        'can_move_down': (lambda: current.can_move_down(board), None),
+        'move_left_right': (move_sideways, None),
+        'rotate': (lambda: current.rotate(board), None),
+        'drop_distance': (lambda: current.drop_distance(board), None),
+        # Spawn the next tetromino and hand it straight back to the pool
+        'spawn_tetromino': (lambda: state.tetromino_pool.append(state.next_from_queue()), None),
+        'remove_lines': (lambda arguments: arguments[0].remove_lines(arguments[1]), fresh_line_clear),
+    }
+
+
+def render_benchmarks(state, surface) -> dict:
+    full = Renderer(surface, dirty_rects=False)
+    dirty = Renderer(surface)
+    current = state.current_tetromino
+
+    def dirty_frame():
+        # A frame where only the falling piece moved
+        current.x += 1 if current.x < 5 else -1
+        pygame.display.update(dirty.draw(state))
+
+    def full_frame():
+        pygame.display.update(full.draw(state))
+
+    def stack_rebuild():
+        # Redraw every row of placed tiles, as after a restart
+        full.stack.reset()
+        full.stack.update(state.board, state.tetrominos_placed)
+
+    return {
+        'draw_grid': (lambda: draw_grid(surface, BOARD_ORIGIN, BORDER_DIMENSIONS[0], BORDER_DIMENSIONS[1]), None),
+        'render_full': (lambda: full.draw(state), None),
+        'frame_dirty': (dirty_frame, None),
+        'frame_full': (full_frame, None),
+        'stack_rebuild': (stack_rebuild, None),
+    }
+
+
+def time_startup(name: str, repeat: int) -> dict:
+    # Seconds a fresh interpreter takes to run the startup script, run from the working
+    # directory with these modules importable, like the game is
+    env = {**os.environ, 'PYTHONPATH': os.path.dirname(os.path.abspath(__file__))}
+    runs = []
+    for _ in range(repeat):
+        launched = time.time()
+        output = subprocess.run([sys.executable, '-c', STARTUP_SCRIPTS[name], repr(launched)], env=env,
+                                capture_output=True, text=True, check=True).stdout
+        runs.append(float(output.split()[-1]))
+    runs.sort()
+    return {'calls': repeat, 'best_us': runs[0] * 1e6, 'median_us': runs[len(runs) // 2] * 1e6}
+
+
+def run(repeat: int = 5, names=None) -> dict:
+    pygame.init()
+    pygame.display.set_mode(WINDOW_SIZE, 0, 32)
+    surface = pygame.Surface(WINDOW_SIZE, 0, 32)
+    results = []
+    for level, fill in FILL_LEVELS.items():
+        state = make_state(fill)
+        benchmarks = {**engine_benchmarks(state), **render_benchmarks(state, surface)}
+        for name, (function, setup) in benchmarks.items():
+            if names and name not in names:
+                continue
+            results.append({'name': name, 'fill': level, **time_call(function, repeat, setup)})
+    # Startup does not depend on the board
+    for name in STARTUP_SCRIPTS:
+        if not names or name in names:
+            results.append({'name': name, 'fill': None, **time_startup(name, repeat)})
+    return {
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'pygame': pygame.version.ver,
+        'platform': platform.platform(),
+        'video_driver': pygame.display.get_driver(),
+        'results': results,
+    }
+
+
+def compare(report: dict, baseline: dict, threshold: float) -> list[str]:
+    # The benchmarks that got slower than the baseline by more than the threshold ratio
+    previous = {(result['name'], result['fill']): result['median_us'] for result in baseline['results']}
+    regressions = []
+    for result in report['results']:
+        key = (result['name'], result['fill'])
+        if key in previous and result['median_us'] > previous[key] * threshold:
+            regressions.append(f'{key[0]} ({key[1]}): {previous[key]:.2f} us -> {result["median_us"]:.2f} us')
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Time the engine and renderer hot paths on synthetic boards')
+    parser.add_argument('--output', help='write the results to this JSON file')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--compare', metavar='BASELINE', help='fail on slowdowns against an earlier JSON report')
+    parser.add_argument('--threshold', type=float, default=1.25, help='slowdown ratio counted as a regression')
+    parser.add_argument('names', nargs='*', help='only run these benchmarks')
+    args = parser.parse_args()
+    report = run(args.repeat, args.names)
+    for result in report['results']:
+        print(f'{result["name"]:<16} {result["fill"] or "":<12} {result["median_us"]:10.2f} us')
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump(report, file, indent=2)
+    failed = False
+    for result in report['results']:
+        if result['name'] == 'first_frame' and result['median_us'] > FIRST_FRAME_BUDGET * 1000:
+            print(f'first frame over its {FIRST_FRAME_BUDGET} ms budget')
+            failed = True
+    if args.compare:
+        with open(args.compare) as file:
+            regressions = compare(report, json.load(file), args.threshold)
+        for regression in regressions:
+            print('slower:', regression)
+        failed = failed or bool(regressions)
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
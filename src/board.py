@@ -0,0 +1,226 @@
+import random
+from functools import lru_cache
+
+from constants import *
+
+
+# What each cell holds: 0 when it is empty, the code of the tetromino type that left a tile there,
+# or BLOCK_CODE for a tile that did not come from a tetromino
+TYPE_CODES = {tetromino_type: code for code, tetromino_type in enumerate(tetrominos, 1)}
+CODE_TYPES = {code: tetromino_type for tetromino_type, code in TYPE_CODES.items()}
+BLOCK_CODE = len(TYPE_CODES) + 1
+BLOCK_COLOR = (128, 128, 128)
+# The color of each cell code, indexed by code
+CELL_COLORS = (None, *(tetromino_colors[tetromino_type] for tetromino_type in TYPE_CODES), BLOCK_COLOR)
+
+
+@lru_cache(maxsize=4096)
+def row_cells(mask: int, columns: int) -> bytes:
+    # The cells of a row of BLOCK_CODE tiles from its bitmask
+    return bytes(BLOCK_CODE if (mask >> column) & 1 else 0 for column in range(columns))
+
+
+@lru_cache(maxsize=None)
+def zobrist_key(*parts) -> int:
+    # A fixed random 64-bit number for each combination of parts, the same in every process and run
+    # (string seeds are hashed with SHA-512, not the per-process str hash, and skip loading hashlib)
+    return random.Random(repr(parts)).getrandbits(64)
+
+
+@lru_cache(maxsize=None)
+def zobrist_keys(columns: int, rows: int) -> tuple:
+    # Zobrist keys of every cell, indexed [row][column]
+    return tuple(tuple(zobrist_key('cell', column, row) for column in range(columns)) for row in range(rows))
+
+
+class Board:
+    def __init__(self, columns: int = BOARD_COLUMNS, rows: int = BOARD_ROWS):
+        self.columns = columns
+        self.rows = rows
+        # One bitmask per row, bit n is set when column n holds a placed tile
+        self.row_masks = [0] * rows
+        # Number of placed tiles in each row
+        self.row_counts = [0] * rows
+        # The highest placed tile's row in each column, or the row count for empty columns
+        self.column_tops = bytearray([rows] * columns)
+        self.full_row = (1 << columns) - 1
+        # The cell code of every cell, row by row. Like column_tops it is only ever changed in
+        # place, so that views of it (gym_env's observations) stay current.
+        self.cells = bytearray(columns * rows)
+        # Zobrist hash of the occupied cells, the keys of the occupied cells xor-ed together
+        self.cell_keys = zobrist_keys(columns, rows)
+        self.zobrist = 0
+
+    def in_bounds(self, column: int, row: int) -> bool:
+        return 0 <= column < self.columns and 0 <= row < self.rows
+
+    def is_occupied(self, column: int, row: int) -> bool:
+        # Cells outside the board never hold a placed tile (the bounds are checked separately)
+        if not self.in_bounds(column, row):
+            return False
+        return (self.row_masks[row] >> column) & 1 == 1
+
+    def fits(self, orientation, x: int, y: int) -> bool:
+        # Check that a tetromino orientation rotating around cell (x, y) is within bounds and clear of placed tiles
+        left = x + orientation.left
+        if left < 0 or left + orientation.width > self.columns:
+            return False
+        for row_offset, mask in orientation.row_masks:
+            row = y + row_offset
+            if row < 0 or row >= self.rows or self.row_masks[row] & (mask << left):
+                return False
+        return True
+
+    def column_heights(self) -> list[int]:
+        return [self.rows - top for top in self.column_tops]
+
+    def first_occupied_below(self, column: int, row: int) -> int:
+        # The first row under the given cell that holds a placed tile, or the row count if there is none
+        if row < self.column_tops[column]:
+            return self.column_tops[column]
+        # The cell is under an overhang, look down the column
+        for below in range(max(row + 1, 0), self.rows):
+            if (self.row_masks[below] >> column) & 1:
+                return below
+        return self.rows
+
+    def drop_distance(self, orientation, x: int, y: int) -> int:
+        # How many rows a tetromino orientation rotating around cell (x, y) can fall before landing
+        distance = self.rows
+        for column_offset, row_offset in orientation.column_bottoms:
+            bottom = y + row_offset
+            distance = min(distance, self.first_occupied_below(x + column_offset, bottom) - bottom - 1)
+        return distance
+
+    def update_column_top(self, column: int) -> None:
+        top = 0
+        while top < self.rows and not (self.row_masks[top] >> column) & 1:
+            top += 1
+        self.column_tops[column] = top
+
+    def cell(self, column: int, row: int) -> int:
+        # The cell code of a cell on the board
+        return self.cells[row * self.columns + column]
+
+    def add_cell(self, column: int, row: int, code: int = BLOCK_CODE) -> None:
+        # Place a tile in a cell, cells outside the board or already taken are left alone
+        if self.in_bounds(column, row) and not self.is_occupied(column, row):
+            self.cells[row * self.columns + column] = code
+            self.row_masks[row] |= 1 << column
+            self.row_counts[row] += 1
+            self.column_tops[column] = min(self.column_tops[column], row)
+            self.zobrist ^= self.cell_keys[row][column]
+
+    def add_orientation(self, orientation, x: int, y: int, code: int = BLOCK_CODE) -> None:
+        # Place the tiles of a tetromino orientation rotating around cell (x, y), the orientation
+        # has to fit there
+        left = x + orientation.left
+        for row_offset, mask in orientation.row_masks:
+            self.row_masks[y + row_offset] |= mask << left
+            self.row_counts[y + row_offset] += mask.bit_count()
+        for column, row in orientation.cells:
+            self.cells[(y + row) * self.columns + x + column] = code
+            self.column_tops[x + column] = min(self.column_tops[x + column], y + row)
+            self.zobrist ^= self.cell_keys[y + row][x + column]
+
+    def remove_cell(self, column: int, row: int) -> None:
+        # Empty a cell
+        if self.is_occupied(column, row):
+            self.cells[row * self.columns + column] = 0
+            self.row_masks[row] &= ~(1 << column)
+            self.row_counts[row] -= 1
+            self.zobrist ^= self.cell_keys[row][column]
+            if row == self.column_tops[column]:
+                self.update_column_top(column)
+
+    def full_rows(self, rows=None) -> list[int]:
+        # The full rows among the given rows (every row by default), from top to bottom
+        if rows is None:
+            rows = range(self.rows)
+        return sorted(row for row in set(rows) if 0 <= row < self.rows and self.row_counts[row] == self.columns)
+
+    def clear_lines(self, rows=None) -> list[int]:
+        # Remove the full rows among the given rows and drop the rows above them into place,
+        # returning the removed rows
+        cleared = self.full_rows(rows)
+        if not cleared:
+            return cleared
+        # Compact the board in a single pass from the lowest cleared row upwards
+        cleared_rows = set(cleared)
+        columns = self.columns
+        kept = b''.join(self.cells[row * columns:(row + 1) * columns] for row in range(self.rows)
+                        if row not in cleared_rows)
+        self.cells[:] = bytes(len(cleared) * columns) + kept
+        write = cleared[-1]
+        for row in range(cleared[-1], -1, -1):
+            if row in cleared_rows:
+                continue
+            self.row_masks[write] = self.row_masks[row]
+            self.row_counts[write] = self.row_counts[row]
+            write -= 1
+        for row in range(write + 1):
+            self.row_masks[row] = 0
+            self.row_counts[row] = 0
+        # Every column is lowered by the cleared rows below its top, and almost every cell moved
+        for column in range(self.columns):
+            self.update_column_top(column)
+        self.zobrist = self.compute_zobrist()
+        return cleared
+
+    def add_garbage(self, lines: int, hole: int) -> None:
+        # Push the board up by the given number of rows and fill the rows below with BLOCK_CODE
+        # tiles, leaving the hole column empty. Tiles pushed past the top are lost.
+        lines = min(lines, self.rows)
+        if lines <= 0:
+            return
+        mask = self.full_row & ~(1 << hole)
+        garbage_cells = row_cells(mask, self.columns)
+        self.row_masks = self.row_masks[lines:] + [mask] * lines
+        self.row_counts = self.row_counts[lines:] + [mask.bit_count()] * lines
+        self.cells[:] = self.cells[lines * self.columns:] + garbage_cells * lines
+        for column in range(self.columns):
+            self.update_column_top(column)
+        self.zobrist = self.compute_zobrist()
+
+    def compute_zobrist(self) -> int:
+        zobrist = 0
+        for row, mask in enumerate(self.row_masks):
+            keys = self.cell_keys[row]
+            while mask:
+                lowest = mask & -mask
+                zobrist ^= keys[lowest.bit_length() - 1]
+                mask ^= lowest
+        return zobrist
+
+    def copy(self) -> 'Board':
+        board = Board.__new__(Board)
+        board.columns, board.rows, board.full_row = self.columns, self.rows, self.full_row
+        board.row_masks = self.row_masks.copy()
+        board.cells = self.cells.copy()
+        board.row_counts = self.row_counts.copy()
+        board.column_tops = self.column_tops.copy()
+        board.cell_keys, board.zobrist = self.cell_keys, self.zobrist
+        return board
+
+    @classmethod
+    def from_row_masks(cls, row_masks, columns: int = BOARD_COLUMNS, zobrist: int | None = None,
+                       cells=None) -> 'Board':
+        # A board with the given rows filled, its tiles having the given cell codes or BLOCK_CODE
+        board = cls(columns, len(row_masks))
+        board.row_masks = list(row_masks)
+        if cells is None:
+            board.cells[:] = b''.join(row_cells(mask, columns) for mask in board.row_masks)
+        else:
+            board.cells[:] = cells
+        board.row_counts = [mask.bit_count() for mask in board.row_masks]
+        for column in range(columns):
+            board.update_column_top(column)
+        board.zobrist = board.compute_zobrist() if zobrist is None else zobrist
+        return board
+
+    def clear(self) -> None:
+        self.cells[:] = bytes(self.columns * self.rows)
+        self.row_masks = [0] * self.rows
+        self.row_counts = [0] * self.rows
+        self.column_tops[:] = bytes([self.rows]) * self.columns
+        self.zobrist = 0
@@ -1,12 +1,16 @@
+import pygame
+
 from constants import *
+from assets import get_font, render_text
 
 
 class Button:
     def __init__(self, text, x, y, font_size=36):
-        self.font = pygame.font.Font('src/font/Ubuntu-Medium.ttf', font_size)
+        self.font = get_font(FONT_PATH, font_size)
+        self.font_size = font_size
 
         # Place the text field
-        self.text = self.font.render(text, True, WHITE)
+        self.text = render_text(text, font_size, WHITE)
         self.x, self.y = x, y
 
         # Create rect and update its position to track the text
@@ -26,4 +30,4 @@ class Button:
         return self.hovering() and pygame.mouse.get_pressed()[0]
 
     def update_text(self, new_text):
-        self.text = self.font.render(new_text, True, WHITE)
+        self.text = render_text(new_text, self.font_size, WHITE)
@@ -0,0 +1,96 @@
+import argparse
+import asyncio
+import random
+from typing import NamedTuple
+
+from game_state import *
+from randomizer import PREVIEW_LENGTH, RANDOMIZER_CODES, RANDOMIZERS
+from server import (DEFAULT_HOST, DEFAULT_PORT, END_GAME, END_GAME_REQUEST, FRAME, NEW_GAME, NEW_GAME_REQUEST, OK,
+                    REPLY, STEP, STEP_REQUEST)
+from snapshot import Snapshot
+
+
+class ServerError(Exception):
+    pass
+
+
+class Reply(NamedTuple):
+    session: int
+    game_over: bool
+    # Lines cleared by the steps of the request
+    lines: int
+    snapshot: Snapshot
+
+
+class GameClient:
+    # Plays games on a server, one request at a time over a single connection
+    def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.reader = reader
+        self.writer = writer
+
+    @classmethod
+    async def connect(cls, path: str | None = None, host: str = DEFAULT_HOST, port: int = DEFAULT_PORT) -> 'GameClient':
+        if path is not None:
+            return cls(*await asyncio.open_unix_connection(path))
+        return cls(*await asyncio.open_connection(host, port))
+
+    async def request(self, payload: bytes) -> Reply:
+        self.writer.write(FRAME.pack(len(payload)) + payload)
+        (length,) = FRAME.unpack(await self.reader.readexactly(FRAME.size))
+        data = await self.reader.readexactly(length)
+        status, session, game_over, lines = REPLY.unpack_from(data)
+        if status != OK:
+            raise ServerError(data[REPLY.size:].decode())
+        body = data[REPLY.size:]
+        return Reply(session, bool(game_over), lines, Snapshot.from_bytes(body) if body else None)
+
+    async def new_game(self, seed: int | None = None, randomizer: str = 'uniform',
+                       preview: int = PREVIEW_LENGTH) -> Reply:
+        return await self.request(NEW_GAME_REQUEST.pack(NEW_GAME, -1 if seed is None else seed,
+                                                        RANDOMIZER_CODES[randomizer], preview))
+
+    async def step(self, session: int, actions, dt: float = SIMULATION_STEP) -> Reply:
+        # Apply the actions to a game, one step of dt milliseconds each
+        actions = bytes(actions)
+        return await self.request(STEP_REQUEST.pack(STEP, session, dt, len(actions)) + actions)
+
+    async def end_game(self, session: int) -> None:
+        await self.request(END_GAME_REQUEST.pack(END_GAME, session))
+
+    async def close(self) -> None:
+        self.writer.close()
+        await self.writer.wait_closed()
+
+
+async def play(client: GameClient, seed: int, randomizer: str, batch: int) -> Reply:
+    # Play a game of random key presses, a batch of them per request
+    rng = random.Random(seed)
+    reply = await client.new_game(seed, randomizer)
+    while not reply.game_over:
+        reply = await client.step(reply.session, [rng.choice(RANDOM_ACTIONS) for _ in range(batch)])
+    await client.end_game(reply.session)
+    return reply
+
+
+async def run(args) -> None:
+    client = await GameClient.connect(args.unix, args.host, args.port)
+    try:
+        reply = await play(client, args.seed, args.randomizer, args.batch)
+    finally:
+        await client.close()
+    print(f'score {reply.snapshot.score}, {reply.snapshot.tetrominos_placed} pieces placed')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Play a game of random key presses on a game server')
+    parser.add_argument('--unix', metavar='PATH', help='connect to this Unix socket instead of TCP')
+    parser.add_argument('--host', default=DEFAULT_HOST)
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--randomizer', choices=RANDOMIZERS, default='uniform')
+    parser.add_argument('--batch', type=int, default=8, help='actions sent per request')
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == '__main__':
+    main()
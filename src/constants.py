@@ -1,27 +1,25 @@
-import pygame
-pygame.font.init()
-
 # Define the window dimensions
 WINDOW_SIZE = (850, 600)
 
 # Game Font
-MAIN_FONT = pygame.font.Font('src/font/Ubuntu-Medium.ttf', 24)
-TITLE_FONT = pygame.font.Font('src/font/Ubuntu-Medium.ttf', 48)
+FONT_PATH = 'src/font/Ubuntu-Medium.ttf'
 # GRID CONSTS
 TILE_SIZE = 32  # The size of a tile
 GRID_WIDTH = 2
+BOARD_COLUMNS = 10  # Number of columns on the playfield
+BOARD_ROWS = 15     # Number of rows on the playfield
 
 # Bounds
-LEFT_BOUND = TILE_SIZE * 7                  # Left Bound
-RIGHT_BOUND = TILE_SIZE * 16                # Right Bound
-LOWER_BOUND = TILE_SIZE * 16                # Lower Bound
-UPPER_BOUND = TILE_SIZE * 2                 # Upper Bound
+LEFT_BOUND = TILE_SIZE * 7                                  # Left Bound
+RIGHT_BOUND = LEFT_BOUND + TILE_SIZE * (BOARD_COLUMNS - 1)  # Right Bound
+UPPER_BOUND = TILE_SIZE * 2                                 # Upper Bound
+LOWER_BOUND = UPPER_BOUND + TILE_SIZE * (BOARD_ROWS - 1)    # Lower Bound
 
 # Box positioning and dimensions
 UPCOMING_BLOCK_POSITION = (TILE_SIZE * 18, UPPER_BOUND)
 HELD_POSITION = (TILE_SIZE, UPPER_BOUND)
 
-BORDER_DIMENSIONS = (10 * TILE_SIZE, 15 * TILE_SIZE)
+BORDER_DIMENSIONS = (BOARD_COLUMNS * TILE_SIZE, BOARD_ROWS * TILE_SIZE)
 UPCOMING_DIMENSIONS = (5 * TILE_SIZE, 12 * TILE_SIZE)
 HELD_DIMENSIONS = (5 * TILE_SIZE, 4 * TILE_SIZE)
 
@@ -29,13 +27,24 @@ HELD_DIMENSIONS = (5 * TILE_SIZE, 4 * TILE_SIZE)
 POINTS_PER_LINE = 100
 POINTS_PER_TETRIS = 800
 
-# Default position of the next tetromino
-DEFAULT_POSITIONS = [
-    [(5, 2), (6, 2), (7, 2), (8, 2)],
-    [(5, 3), (6, 3), (7, 3), (8, 3)],
-    [(5, 4), (6, 4), (7, 4), (8, 4)],
-    [(5, 5), (6, 5), (7, 5), (8, 5)]
-]
+# Gravity (milliseconds per row), sped up as the score increases
+BASE_TICK_SPEED = 1000
+MIN_TICK_SPEED = 150
+TICK_SPEED_RAMP = 825 / 4000
+
+# The game logic advances in fixed steps (milliseconds), however fast the screen is drawn.
+# Frames that took longer than the limit only advance the game by the limit.
+SIMULATION_STEP = 1000 / 120
+MAX_FRAME_TIME = 250
+
+# Placed tiles in the top rows of the board end the game
+TOP_OUT_ROWS = 2
+
+# Board cell (column, row) of the top-left corner of a new tetromino's matrix
+SPAWN_POSITION = (4, 0)
+
+# Try shifting a blocked rotation into a free spot (SRS wall kicks) instead of refusing it
+WALL_KICKS = False
 
 # Tetromino types and their corresponding binary position matrices
 tetrominos = {
@@ -67,6 +76,17 @@ tetrominos = {
           [1, 1, 1],
           [0, 0, 0]]
 }
+# Cell (column, row) of each tetromino's matrix that it rotates around.
+# The straight piece turns about a point between its middle tiles, the square piece never turns.
+rotation_origins = {
+    'I': (2, 1),
+    'J': (1, 1),
+    'L': (1, 1),
+    'O': (1, 1),
+    'S': (1, 1),
+    'Z': (1, 1),
+    'T': (1, 1)
+}
 # Dict of block type mapped onto block color
 tetromino_colors = {
     'I': (0, 255, 255),
@@ -84,3 +104,5 @@ BLACK = (0, 0, 0)
 RED = (255, 0, 0)
 GREEN = (0, 255, 0)
 BLUE = (0, 0, 255)
+# Color key of the see-through parts of a surface
+TRANSPARENT = (255, 0, 255)
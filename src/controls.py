@@ -0,0 +1,161 @@
+from collections import deque
+from time import perf_counter
+
+from pygame.locals import *
+
+from constants import *
+from game_state import *
+from profiler import PROFILE_WINDOW, percentile
+
+# Keys mapped onto the game actions they trigger
+KEY_ACTIONS = {
+    # PLACE PIECE BELOW WITH ( SPACE )
+    K_SPACE: HARD_DROP,
+    # TURN PIECE WITH ( UP_ARROW OR Z )
+    K_UP: ROTATE,
+    ord('z'): ROTATE,
+    # HOLD PIECE WITH ( C )
+    ord('c'): HOLD,
+    # DIRECTIONAL MOVEMENT
+    K_DOWN: SOFT_DROP,
+    ord('s'): SOFT_DROP,
+    K_RIGHT: MOVE_RIGHT,
+    ord('d'): MOVE_RIGHT,
+    K_LEFT: MOVE_LEFT,
+    ord('a'): MOVE_LEFT,
+}
+# Holding left or right moves once, waits DELAYED_AUTO_SHIFT and then moves every
+# AUTO_REPEAT_RATE (milliseconds, 0 moves all the way at once)
+DELAYED_AUTO_SHIFT = 167
+AUTO_REPEAT_RATE = 33
+# Holding soft drop moves down once and then every SOFT_DROP_INTERVAL (milliseconds, 0 drops all the way)
+SOFT_DROP_INTERVAL = 50
+
+
+class LatencyMeter:
+    # Time from reading a key press to handing the first frame that shows its effect to the
+    # display. Presses are timed from when pygame gave them to the game, the operating system
+    # and the monitor add their own delay on either side.
+    def __init__(self, window: int = PROFILE_WINDOW):
+        self.samples = deque(maxlen=window)
+        # Read times of the presses applied since the last frame was displayed, bounded so that
+        # loops which never display a frame do not pile them up
+        self.pending = deque(maxlen=window)
+
+    def applied(self, read_time: float) -> None:
+        self.pending.append(read_time)
+
+    def displayed(self) -> None:
+        if self.pending:
+            now = perf_counter()
+            self.samples.extend(now - read_time for read_time in self.pending)
+            self.pending.clear()
+
+    def percentiles(self, fractions=(0.5, 0.99)) -> tuple:
+        # Rolling percentiles (seconds), zeros before any press was measured
+        if not self.samples:
+            return tuple(0 for _ in fractions)
+        return tuple(percentile(self.samples, fraction) for fraction in fractions)
+
+
+input_latency = LatencyMeter()
+
+
+class KeyRepeater:
+    # Turns key presses and releases into the game actions due in each simulation step,
+    # repeating held movement keys. Events are stamped with the game time they were read at
+    # and repeats are scheduled from those stamps, so every step gets the moves that fall
+    # inside it however the frames line up with the steps.
+    # Shared settings, changed from the command line
+    das = DELAYED_AUTO_SHIFT
+    arr = AUTO_REPEAT_RATE
+    soft_drop = SOFT_DROP_INTERVAL
+
+    def __init__(self, key_actions=KEY_ACTIONS, columns: int = BOARD_COLUMNS):
+        self.key_actions = key_actions
+        # Moves that take a piece across the whole board, for an auto-repeat rate of 0
+        self.columns = columns
+        # (game time, action, read time) of the presses not applied yet
+        self.presses = []
+        # The action of every key held down
+        self.held_keys = {}
+        # The held direction and the game time its next repeat is due, None when not shifting
+        self.shift = None
+        # The game time the next soft drop repeat is due, None when not dropping, and the
+        # tetromino (placed count, held) it drops
+        self.drop = None
+        self.drop_piece = None
+
+    def handle_event(self, event, now: float) -> None:
+        if event.type == KEYDOWN and event.key in self.key_actions:
+            action = self.key_actions[event.key]
+            self.held_keys[event.key] = action
+            self.presses.append((now, action, perf_counter()))
+            # The latest direction pressed takes over from the other one
+            if action in (MOVE_LEFT, MOVE_RIGHT):
+                self.shift = (action, now + self.das)
+            elif action == SOFT_DROP:
+                self.drop = now + self.soft_drop
+        elif event.type == KEYUP and event.key in self.held_keys:
+            action = self.held_keys.pop(event.key)
+            if action in self.held_keys.values():
+                # Another key for the same action is still down
+                return
+            if self.shift and self.shift[0] == action:
+                # Fall back to the other direction if it is still held, charging it again
+                other = MOVE_LEFT if action == MOVE_RIGHT else MOVE_RIGHT
+                self.shift = (other, now + self.das) if other in self.held_keys.values() else None
+            elif action == SOFT_DROP:
+                self.drop = None
+        elif event.type == WINDOWFOCUSLOST:
+            # Key releases go to other windows, let go of everything
+            self.held_keys = {}
+            self.shift = self.drop = None
+
+    def actions_until(self, end: float) -> list[int]:
+        # The actions due before game time end, in the order they were due. Presses count as
+        # due straight away, the first step after they were read applies them.
+        due = []
+        for pressed_at, action, read_time in self.presses:
+            due.append((pressed_at, action))
+            input_latency.applied(read_time)
+        self.presses = []
+        if self.shift is not None:
+            action, repeat_at = self.shift
+            if self.arr <= 0:
+                if repeat_at < end:
+                    due += [(repeat_at, action)] * self.columns
+            else:
+                while repeat_at < end:
+                    due.append((repeat_at, action))
+                    repeat_at += self.arr
+                self.shift = (action, repeat_at)
+        if self.drop is not None:
+            if self.soft_drop <= 0:
+                # All the way down, once
+                due.append((self.drop, SONIC_DROP))
+                self.drop = None
+            else:
+                while self.drop < end:
+                    due.append((self.drop, DROP_ROW))
+                    self.drop += self.soft_drop
+        due.sort(key=lambda item: item[0])
+        return [action for _, action in due]
+
+    def run_step(self, state, end: float, step) -> None:
+        # Apply the actions due before game time end as one simulation step, through
+        # step(action, dt): the first action along with the step's time and any others straight
+        # after it. Held soft drop only moves the tetromino it was pressed for and stops once
+        # that one is placed or swapped for the held one.
+        dt = SIMULATION_STEP
+        for action in self.actions_until(end):
+            piece = (state.tetrominos_placed, state.using_held_piece)
+            if action == SOFT_DROP:
+                self.drop_piece = piece
+            elif action in (DROP_ROW, SONIC_DROP) and piece != self.drop_piece:
+                self.drop = None
+                continue
+            step(action, dt)
+            dt = 0
+        if dt:
+            step(NO_OP, dt)
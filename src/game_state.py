@@ -0,0 +1,204 @@
+import random
+from collections import namedtuple
+
+from constants import *
+from board import TYPE_CODES, Board
+from profiler import frame_profiler
+from randomizer import PREVIEW_LENGTH, TETROMINO_TYPES, PreviewQueue, make_randomizer
+from tetromino import Tetromino
+
+# Actions understood by GameState.step
+NO_OP = 0
+MOVE_LEFT = 1
+MOVE_RIGHT = 2
+SOFT_DROP = 3
+ROTATE = 4
+HOLD = 5
+HARD_DROP = 6
+# Held soft drop: down a row, or all the way down, never placing the tetromino
+DROP_ROW = 7
+SONIC_DROP = 8
+# Random key presses, mostly waiting, for playing games to test and measure with
+RANDOM_ACTIONS = (NO_OP,) * 8 + (MOVE_LEFT, MOVE_RIGHT, SOFT_DROP, ROTATE, HOLD, HARD_DROP)
+
+
+def get_next_tetromino(rng=random):
+    # Choose a random tetromino type (e.g. 'L', 'T', 'Z', ...)
+    tetromino_type = rng.choice(TETROMINO_TYPES)
+    # Create the next random tetromino
+    return Tetromino(tetromino_type)
+
+
+# Milliseconds per row at the start, the fastest it gets and how much faster each point makes it
+Gravity = namedtuple('Gravity', ['base', 'minimum', 'ramp'], defaults=[BASE_TICK_SPEED, MIN_TICK_SPEED,
+                                                                      TICK_SPEED_RAMP])
+
+
+DEFAULT_GRAVITY = Gravity()
+
+
+def get_tick_speed(score: int, gravity: Gravity = DEFAULT_GRAVITY) -> float:
+    # Adjust the tick speed to the score
+    return max(gravity.base - gravity.ramp * score, gravity.minimum)
+
+
+def get_line_points(lines: int) -> int:
+    # Points for clearing lines at once (tetris is bonus points)
+    return POINTS_PER_TETRIS if lines == 4 else POINTS_PER_LINE * lines
+
+
+class GameState:
+    def __init__(self, seed: int | None = None, gravity: Gravity = DEFAULT_GRAVITY, randomizer: str = 'uniform',
+                 preview: int = PREVIEW_LENGTH):
+        # Every piece comes from a generator seeded here, so a seed and the steps taken replay the same game
+        self.seed = random.randrange(1 << 63) if seed is None else seed
+        self.rng = random.Random(self.seed)
+        self.randomizer = make_randomizer(randomizer, self.rng)
+        # The board holding the placed tiles
+        self.board = Board()
+        self.tetrominos_placed = 0
+        self.score = 0
+        # How fast the blocks fall (milliseconds)
+        self.gravity = gravity
+        self.tick_speed = gravity.base
+        # Placed tetrominos, respawned as the next ones instead of making new objects
+        self.tetromino_pool = []
+        # Generate a current tetromino and the preview of the ones after it
+        self.current_tetromino = Tetromino(self.randomizer.next_type())
+        self.held_tetromino = None
+        self.using_held_piece = False
+        self.preview = PreviewQueue(self.randomizer, preview)
+        # Tick tracking
+        self.prior_elapsed = 0
+        self.time_elapsed = 1
+        self.place_block_timer = 0
+        # (lines, hole column) of the garbage sent by opponents, pushed into the board when the
+        # next tetromino locks without clearing a line
+        self.pending_garbage = []
+        # Rows cleared during the latest step
+        self.cleared_rows = []
+        self.game_over = False
+
+    def step(self, action: int = NO_OP, dt: float = 0) -> int:
+        # Apply the action, advance the game by dt milliseconds and return the number of lines cleared.
+        # The action goes first so that it takes effect within the same step.
+        self.cleared_rows = []
+        self.apply(action)
+        self.update(dt)
+        # Check if the game is over
+        self.game_over = any(self.board.row_masks[row] for row in range(TOP_OUT_ROWS))
+        return len(self.cleared_rows)
+
+    def update(self, dt: float) -> None:
+        current = self.current_tetromino
+        # Place a piece when the timer runs out
+        if current.can_move_down(self.board):
+            # Shutdown the timer when piece can move down
+            self.place_block_timer = 0
+        elif self.place_block_timer < self.tick_speed:
+            self.place_block_timer += dt
+        else:
+            current.place_tetromino()
+            self.place_block_timer = 0
+        # Generate next piece when current is placed
+        if current.is_placed:
+            self.lock_tetromino()
+        self.tick_speed = get_tick_speed(self.score, self.gravity)
+        # Game ticks -> Tetromino moves down
+        self.time_elapsed += dt
+        if self.time_elapsed > self.prior_elapsed + self.tick_speed:
+            # Gravity (every game tick, move the tetromino down and update the prior tick checkpoint)
+            self.current_tetromino.move_down(self.board)
+            self.prior_elapsed = self.time_elapsed
+
+    def lock_tetromino(self) -> None:
+        self.tetrominos_placed += 1
+        self.using_held_piece = False
+        # Add the placed tetromino to the board
+        cells = self.current_tetromino.cells()
+        code = TYPE_CODES[self.current_tetromino.type]
+        for column, row in cells:
+            self.board.add_cell(column, row, code)
+        # Remove full lines, only the rows the tetromino landed in can have filled up
+        self.cleared_rows = self.remove_lines(row for column, row in cells)
+        if self.pending_garbage and not self.cleared_rows:
+            self.push_garbage()
+        self.tetromino_pool.append(self.current_tetromino)
+        self.current_tetromino = self.next_from_queue()
+
+    def next_from_queue(self) -> Tetromino:
+        # Spawn the next tetromino of the preview, reusing a placed one when there is one
+        tetromino_type = self.preview.pop()
+        if not self.tetromino_pool:
+            return Tetromino(tetromino_type)
+        tetromino = self.tetromino_pool.pop()
+        tetromino.respawn(tetromino_type)
+        return tetromino
+
+    def queue_garbage(self, lines: int, hole: int) -> None:
+        self.pending_garbage.append((lines, hole))
+
+    def cancel_garbage(self, lines: int) -> int:
+        # Take lines off the pending garbage, oldest first, returning the lines left over
+        while lines and self.pending_garbage:
+            pending, hole = self.pending_garbage[0]
+            if pending > lines:
+                self.pending_garbage[0] = (pending - lines, hole)
+                return 0
+            lines -= pending
+            self.pending_garbage.pop(0)
+        return lines
+
+    def push_garbage(self) -> None:
+        for lines, hole in self.pending_garbage:
+            self.board.add_garbage(lines, hole)
+        self.pending_garbage = []
+
+    def apply(self, action: int) -> None:
+        current = self.current_tetromino
+        # PLACE PIECE BELOW
+        if action == HARD_DROP:
+            if not current.is_placed:
+                current.hard_drop(self.board)
+        elif action == ROTATE and current.type != 'O':
+            current.rotate(self.board)
+        elif action == HOLD:
+            self.hold()
+        elif action == SOFT_DROP:
+            current.move_down(self.board)
+        elif action == DROP_ROW:
+            if not current.is_placed and current.can_move_down(self.board):
+                current.y += 1
+        elif action == SONIC_DROP:
+            if not current.is_placed:
+                current.y += current.drop_distance(self.board)
+        elif action == MOVE_RIGHT:
+            current.move_right(self.board)
+        elif action == MOVE_LEFT:
+            current.move_left(self.board)
+
+    def hold(self) -> None:
+        if self.using_held_piece:
+            return
+        self.using_held_piece = True
+        if self.held_tetromino is None:
+            # Hold a piece and refill the queue
+            self.held_tetromino = self.current_tetromino
+            self.current_tetromino = self.next_from_queue()
+        else:
+            # Use the held piece, resetting its position and orientation
+            self.tetromino_pool.append(self.current_tetromino)
+            self.current_tetromino = self.held_tetromino
+            self.current_tetromino.reset()
+            # Make the held tetromino slot empty again
+            self.held_tetromino = None
+
+    def remove_lines(self, rows) -> list[int]:
+        # Clear the full lines among the given rows and lower the tiles above them
+        frame_profiler.mark('update')
+        lines_removed = self.board.clear_lines(rows)
+        if len(lines_removed) > 0:
+            # Increment the score (tetris is bonus points)
+            self.score += get_line_points(len(lines_removed))
+        frame_profiler.mark('remove_lines')
+        return lines_removed
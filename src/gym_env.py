@@ -0,0 +1,139 @@
+import numpy as np
+
+from constants import *
+from board import TYPE_CODES
+from game_state import *
+from randomizer import PREVIEW_LENGTH
+
+ACTION_COUNT = HARD_DROP + 1
+# What an observation can hold:
+#   board    (rows, columns) uint8 cell codes, 0 for empty (see board.TYPE_CODES and BLOCK_CODE)
+#   piece    (4,) int16 type code, rotation, x and y of the falling tetromino's rotation origin
+#   hold     (1,) uint8 type code of the held tetromino, 0 for none
+#   preview  (preview,) uint8 type codes of the upcoming tetrominos, next first
+#   heights  (columns,) uint8 height of the stack in each column, worked out from the board's column_tops
+#   pixels   (rows * scale, columns * scale, 3) uint8 RGB picture of the board and falling tetromino
+OBSERVATIONS = ('board', 'piece', 'hold', 'preview', 'heights', 'pixels')
+DEFAULT_OBSERVATIONS = ('board', 'piece', 'hold', 'preview', 'heights')
+# Pixels per cell of the pixel observation
+PIXEL_SCALE = 4
+
+
+def read_only(array: np.ndarray) -> np.ndarray:
+    view = array.view()
+    view.flags.writeable = False
+    return view
+
+
+class TetrisEnv:
+    # reset()/step() over a GameState for reinforcement learning, in the style of a Gymnasium
+    # environment (without depending on it). Actions are the GameState actions, NO_OP to
+    # HARD_DROP, and the reward is the score gained.
+    #
+    # Observations are a dict of read-only arrays which are the same objects on every step of
+    # an episode and change in place: the board is a view of the engine's own buffer, the
+    # other parts are small buffers of the environment filled in place every step (heights
+    # with a single NumPy subtraction from a view of the board's column tops, no new arrays).
+    # Copy an observation to keep it past the next step.
+    def __init__(self, observations=DEFAULT_OBSERVATIONS, seed=None, randomizer: str = 'uniform',
+                 preview: int = PREVIEW_LENGTH, dt: float = SIMULATION_STEP, max_steps: int | None = None,
+                 pixel_scale: int = PIXEL_SCALE):
+        unknown = set(observations) - set(OBSERVATIONS)
+        if unknown:
+            raise ValueError(f'unknown observations {sorted(unknown)}, choose from {OBSERVATIONS}')
+        self.observation_names = tuple(observations)
+        self.seed = seed
+        self.randomizer = randomizer
+        self.preview_length = preview
+        self.dt = dt
+        self.max_steps = max_steps
+        self.pixel_scale = pixel_scale
+        self.state = None
+        self.steps = 0
+        self.observation = {}
+        self.info = {'score': 0, 'lines': 0, 'tetrominos_placed': 0}
+        # The environment's own buffers, only handed out as read-only views
+        self.piece = np.zeros(4, dtype=np.int16)
+        self.hold = np.zeros(1, dtype=np.uint8)
+        self.preview = np.zeros(preview, dtype=np.uint8)
+        self.heights = np.zeros(BOARD_COLUMNS, dtype=np.uint8)
+        self.pixels = None
+        self.layer = None
+        if 'pixels' in self.observation_names:
+            # Drawn with the game's renderer on a surface of its own, no window is needed
+            import pygame
+            from renderer import StackLayer, draw_tetromino
+            self.draw_tetromino = draw_tetromino
+            self.surface_to_array = pygame.pixelcopy.surface_to_array
+            self.canvas = pygame.surface.Surface((BOARD_COLUMNS * pixel_scale, BOARD_ROWS * pixel_scale), 0, 32)
+            self.layer = StackLayer(BOARD_COLUMNS, BOARD_ROWS, pixel_scale)
+            # pygame arrays are indexed [x, y], the observation is the transpose of this one
+            self.pixels = np.zeros((BOARD_COLUMNS * pixel_scale, BOARD_ROWS * pixel_scale, 3), dtype=np.uint8)
+
+    def reset(self, seed=None) -> tuple[dict, dict]:
+        # Start a new game, returning its first observation and info
+        if seed is None and self.seed is not None:
+            # A fixed seed gives a different, but repeatable, game every episode
+            seed = self.seed
+            self.seed += 1
+        self.state = GameState(seed, randomizer=self.randomizer, preview=self.preview_length)
+        self.steps = 0
+        self.bind()
+        self.update()
+        self.info.update(score=0, lines=0, tetrominos_placed=0)
+        return self.observation, self.info
+
+    def bind(self) -> None:
+        # Point the observation at the new game's board, its buffers live as long as the game
+        board = self.state.board
+        cells = np.frombuffer(board.cells, dtype=np.uint8).reshape(board.rows, board.columns)
+        self.column_tops = np.frombuffer(board.column_tops, dtype=np.uint8)
+        if self.heights.shape != self.column_tops.shape:
+            self.heights = np.zeros(board.columns, dtype=np.uint8)
+        views = {'board': cells, 'piece': self.piece, 'hold': self.hold, 'preview': self.preview,
+                 'heights': self.heights, 'pixels': self.pixels}
+        self.observation = {name: read_only(views[name].transpose(1, 0, 2) if name == 'pixels' else views[name])
+                            for name in self.observation_names}
+        if self.layer is not None:
+            self.layer.reset()
+
+    def step(self, action: int) -> tuple[dict, int, bool, bool, dict]:
+        # Apply an action for dt milliseconds, returning (observation, reward, terminated,
+        # truncated, info) like Gymnasium
+        state = self.state
+        score = state.score
+        lines = state.step(action, self.dt)
+        self.steps += 1
+        self.update()
+        info = self.info
+        info['score'] = state.score
+        info['lines'] = lines
+        info['tetrominos_placed'] = state.tetrominos_placed
+        truncated = self.max_steps is not None and self.steps >= self.max_steps
+        return self.observation, state.score - score, state.game_over, truncated, info
+
+    def update(self) -> None:
+        # Refresh the parts of the observation that are not a view of the board
+        state = self.state
+        current = state.current_tetromino
+        piece = self.piece
+        piece[0] = TYPE_CODES[current.type]
+        piece[1] = current.rotation
+        piece[2] = current.x
+        piece[3] = current.y
+        self.hold[0] = TYPE_CODES[state.held_tetromino.type] if state.held_tetromino else 0
+        preview = self.preview
+        for index, tetromino_type in enumerate(state.preview):
+            preview[index] = TYPE_CODES[tetromino_type]
+        np.subtract(state.board.rows, self.column_tops, out=self.heights)
+        if self.pixels is not None:
+            self.render()
+
+    def render(self) -> None:
+        # Draw the board and falling tetromino small, then copy the pixels into the buffer
+        self.canvas.fill(BLACK)
+        self.layer.update(self.state.board, self.state.tetrominos_placed)
+        self.layer.blit(self.canvas, (0, 0))
+        if not self.state.game_over:
+            self.draw_tetromino(self.canvas, self.state.current_tetromino, (0, 0), self.pixel_scale)
+        self.surface_to_array(self.pixels, self.canvas)
@@ -0,0 +1,78 @@
+import argparse
+import asyncio
+import json
+import random
+import time
+
+from game_state import *
+from client import GameClient
+from profiler import percentile
+from server import DEFAULT_HOST, DEFAULT_PORT, start_server
+
+
+async def drive(client: GameClient, requests: int, batch: int, seed: int, latencies: list) -> int:
+    # Send step requests of random actions over one connection, starting a new game whenever one
+    # ends, and record how long each request took to be answered. Returns the games played.
+    rng = random.Random(seed)
+    reply = await client.new_game(seed)
+    games = 1
+    for _ in range(requests):
+        if reply.game_over:
+            await client.end_game(reply.session)
+            reply = await client.new_game(rng.randrange(1 << 32))
+            games += 1
+        batch_actions = [rng.choice(RANDOM_ACTIONS) for _ in range(batch)]
+        start = time.perf_counter()
+        reply = await client.step(reply.session, batch_actions)
+        latencies.append(time.perf_counter() - start)
+    return games
+
+
+async def run(args) -> dict:
+    server = None
+    if args.serve:
+        # Host the games in this process, sharing its event loop with the clients
+        server = await start_server(args.unix, args.host, args.port)
+    clients = [await GameClient.connect(args.unix, args.host, args.port) for _ in range(args.connections)]
+    latencies = []
+    start = time.perf_counter()
+    try:
+        games = await asyncio.gather(*(drive(client, args.requests, args.batch, args.seed + number, latencies)
+                                       for number, client in enumerate(clients)))
+    finally:
+        for client in clients:
+            await client.close()
+        if server is not None:
+            server.close()
+            await server.wait_closed()
+    elapsed = time.perf_counter() - start
+    return {
+        'connections': args.connections,
+        'requests': len(latencies),
+        'actions_per_request': args.batch,
+        'games': sum(games),
+        'requests_per_second': round(len(latencies) / elapsed, 1),
+        'steps_per_second': round(len(latencies) * args.batch / elapsed, 1),
+        'latency_p50_ms': round(percentile(latencies, 0.5) * 1000, 3),
+        'latency_p99_ms': round(percentile(latencies, 0.99) * 1000, 3),
+        'latency_max_ms': round(max(latencies) * 1000, 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure the request rate and latency of a game server')
+    parser.add_argument('--unix', metavar='PATH', help='connect to this Unix socket instead of TCP')
+    parser.add_argument('--host', default=DEFAULT_HOST)
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    parser.add_argument('--serve', action='store_true', help='start the server in this process first')
+    parser.add_argument('--connections', type=int, default=16, help='clients sending requests at once')
+    parser.add_argument('--requests', type=int, default=1000, help='step requests sent by each client')
+    parser.add_argument('--batch', type=int, default=8, help='actions per step request')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    report = asyncio.run(run(args))
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,129 @@
+import argparse
+import random
+import sys
+
+import numpy as np
+
+from constants import *
+from batched_env import BatchedEnv
+from board import TYPE_CODES
+from game_state import *
+from randomizer import PREVIEW_LENGTH, TETROMINO_TYPES, PreviewQueue
+from search import Bot, PlacementSearch
+from tetromino import Tetromino
+
+# Chance of a random key press instead of the bot's action, so that holds, soft drops and
+# stray rotations get played as well as clean placements (only the actions BatchedEnv knows,
+# the held soft drop ones are left out)
+NOISE = 0.1
+NOISE_ACTIONS = [NO_OP, MOVE_LEFT, MOVE_RIGHT, SOFT_DROP, ROTATE, HOLD, HARD_DROP]
+
+
+class SequenceRandomizer:
+    # Deals tetromino types from a fixed list of type indices
+    def __init__(self, types):
+        self.types = iter(types)
+
+    def next_type(self) -> str:
+        return TETROMINO_TYPES[next(self.types)]
+
+
+class SequencedEnv(BatchedEnv):
+    # A BatchedEnv whose boards deal from fixed lists of type indices instead of its random generator
+    def __init__(self, sequences, dt: float):
+        self.sequences = [iter(types) for types in sequences]
+        super().__init__(len(sequences), dt=dt)
+
+    def next_types(self, count: int) -> np.ndarray:
+        # Only called by reset, for every board at once: the current pieces, then each preview slot
+        return np.array([next(types) for _ in range(count // self.num_boards) for types in self.sequences])
+
+    def next_from_queue(self, indices) -> None:
+        self.spawn(indices, self.upcoming[indices, 0])
+        self.upcoming[indices, :-1] = self.upcoming[indices, 1:]
+        self.upcoming[indices, -1] = [next(self.sequences[index]) for index in indices]
+
+
+def sequenced_state(types) -> GameState:
+    # A GameState dealing from the list of type indices, in the same order as SequencedEnv
+    state = GameState()
+    state.randomizer = SequenceRandomizer(types)
+    state.current_tetromino = Tetromino(state.randomizer.next_type())
+    state.preview = PreviewQueue(state.randomizer, PREVIEW_LENGTH)
+    return state
+
+
+def differences(state: GameState, env: BatchedEnv, index: int) -> list[str]:
+    # What differs between a GameState and one board of a BatchedEnv
+    found = []
+    if state.game_over != env.done[index]:
+        found.append(f'game over {state.game_over} != {env.done[index]}')
+    cells = np.frombuffer(state.board.cells, dtype=np.uint8).reshape(state.board.rows, state.board.columns)
+    if not np.array_equal(cells, env.boards[index]):
+        found.append(f'boards differ\n{cells}\n{env.boards[index]}')
+    if state.score != env.score[index]:
+        found.append(f'score {state.score} != {env.score[index]}')
+    if state.game_over:
+        return found
+    columns, rows = env.piece_cells(np.array([index]))
+    if sorted(state.current_tetromino.cells()) != sorted(zip(columns[0].tolist(), rows[0].tolist())):
+        found.append('falling tetrominos differ')
+    held = TYPE_CODES[state.held_tetromino.type] - 1 if state.held_tetromino else -1
+    if held != env.held_type[index]:
+        found.append(f'held type {held} != {env.held_type[index]}')
+    return found
+
+
+def check(seed: int, boards: int, steps: int, dt: float) -> tuple[list[str], BatchedEnv]:
+    # Play the same games on GameStates and a BatchedEnv side by side, returning the first
+    # differences found (none if they matched throughout) and the BatchedEnv
+    rng = random.Random(seed)
+    # Enough for a tetromino placed every step, plus the first preview and a hold
+    sequences = [[rng.randrange(len(TETROMINO_TYPES)) for _ in range(steps + PREVIEW_LENGTH + 2)]
+                 for _ in range(boards)]
+    env = SequencedEnv(sequences, dt)
+    states = [sequenced_state(types) for types in sequences]
+    bots = [Bot(PlacementSearch(beam_width=1, depth=1)) for _ in range(boards)]
+    actions = np.zeros(boards, dtype=np.int64)
+    for step in range(steps):
+        for index, state in enumerate(states):
+            if state.game_over:
+                continue
+            action = bots[index].act(state)
+            if rng.random() < NOISE:
+                action = rng.choice(NOISE_ACTIONS)
+            actions[index] = action
+            state.step(action, dt)
+        env.step(actions)
+        for index, state in enumerate(states):
+            found = differences(state, env, index)
+            if found:
+                return [f'seed {seed} board {index} step {step}: {difference}' for difference in found], env
+        if all(state.game_over for state in states):
+            break
+    return [], env
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Check that BatchedEnv plays exactly like GameState, '
+                                                 'board by board, given the same tetrominos and actions')
+    parser.add_argument('--seeds', type=int, default=20)
+    parser.add_argument('--boards', type=int, default=4, help='boards played side by side for each seed')
+    parser.add_argument('--steps', type=int, default=1000, help='steps played for each seed')
+    parser.add_argument('--dt', type=float, default=SIMULATION_STEP, help='milliseconds per step')
+    args = parser.parse_args()
+    placed = lines = 0
+    for seed in range(args.seeds):
+        found, env = check(seed, args.boards, args.steps, args.dt)
+        if found:
+            print('\n'.join(found))
+            print('FAILED')
+            sys.exit(1)
+        placed += int(env.tetrominos_placed.sum())
+        lines += int(env.lines_cleared.sum())
+    print(f'{args.seeds} seeds of {args.boards} boards matched, {placed} tetrominos placed and {lines} lines cleared')
+    print('OK')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,85 @@
+from collections import deque
+from time import perf_counter
+
+# Frames the rolling percentiles are taken over
+PROFILE_WINDOW = 600
+
+
+def percentile(values, fraction: float) -> float:
+    values = sorted(values)
+    return values[min(int(fraction * len(values)), len(values) - 1)]
+
+
+class Profiler:
+    # Splits every frame into phases: each mark charges the time since the previous mark
+    # to the named phase. Every method returns straight away while disabled.
+    def __init__(self, window: int = PROFILE_WINDOW):
+        self.enabled = False
+        # Phase timings (seconds) of the latest frames, and of every frame while tracing
+        self.frames = deque(maxlen=window)
+        self.trace = None
+        self.current = {}
+        self.frame_start = self.last_mark = 0
+
+    def enable(self, trace=False) -> None:
+        self.enabled = True
+        if trace and self.trace is None:
+            self.trace = []
+
+    def disable(self) -> None:
+        self.enabled = False
+
+    def start_frame(self) -> None:
+        if not self.enabled:
+            return
+        self.current = {}
+        self.frame_start = self.last_mark = perf_counter()
+
+    def mark(self, phase: str) -> None:
+        if not self.enabled:
+            return
+        now = perf_counter()
+        self.current[phase] = self.current.get(phase, 0) + now - self.last_mark
+        self.last_mark = now
+
+    def end_frame(self) -> None:
+        if not self.enabled or not self.frame_start:
+            return
+        self.current['frame'] = perf_counter() - self.frame_start
+        self.frames.append(self.current)
+        if self.trace is not None:
+            self.trace.append(self.current)
+        self.frame_start = 0
+
+    def phases(self, frames=None) -> list[str]:
+        # Phase names in the order they were first seen
+        names = {}
+        for frame in self.frames if frames is None else frames:
+            names.update(dict.fromkeys(frame))
+        return list(names)
+
+    def percentiles(self, fractions=(0.5, 0.99)) -> dict[str, tuple]:
+        # Rolling percentiles (seconds) of every phase over the latest frames, counting a
+        # frame that skipped a phase as zero time spent in it
+        return {phase: tuple(percentile([frame.get(phase, 0) for frame in self.frames], fraction)
+                             for fraction in fractions)
+                for phase in self.phases()}
+
+    def dump(self, path: str) -> None:
+        # Write the traced frames (or the latest ones) to a CSV or JSON file, in milliseconds
+        import csv, json  # only needed on exit, kept out of the engine's import time
+        frames = self.trace if self.trace is not None else list(self.frames)
+        rows = [{phase: seconds * 1000 for phase, seconds in frame.items()} for frame in frames]
+        if path.endswith('.csv'):
+            with open(path, 'w', newline='') as file:
+                writer = csv.DictWriter(file, ['frame_number'] + self.phases(frames), restval=0)
+                writer.writeheader()
+                for frame_number, row in enumerate(rows):
+                    writer.writerow({'frame_number': frame_number, **row})
+        else:
+            with open(path, 'w') as file:
+                json.dump(rows, file)
+
+
+# Shared by the game loop, the scenes, the renderer and the engine
+frame_profiler = Profiler()
@@ -0,0 +1,104 @@
+from collections import deque
+
+from constants import *
+
+# Every tetromino type, in the order the uniform randomizer chooses from
+TETROMINO_TYPES = tuple(tetrominos)
+# Tetrominos shown in the preview by default
+PREVIEW_LENGTH = 3
+# Recent tetrominos the history randomizer avoids, and how often it tries to
+HISTORY_LENGTH = 4
+HISTORY_ROLLS = 4
+
+
+class UniformRandomizer:
+    # Every tetromino is equally likely every time, so droughts and floods happen
+    name = 'uniform'
+
+    def __init__(self, rng):
+        self.rng = rng
+
+    def next_type(self) -> str:
+        return self.rng.choice(TETROMINO_TYPES)
+
+
+class BagRandomizer:
+    # Deals all seven tetrominos in a random order before shuffling them again
+    name = '7-bag'
+
+    def __init__(self, rng):
+        self.rng = rng
+        self.bag = []
+
+    def next_type(self) -> str:
+        if not self.bag:
+            self.bag = list(TETROMINO_TYPES)
+            self.rng.shuffle(self.bag)
+        return self.bag.pop()
+
+
+class HistoryRandomizer:
+    # Rerolls a tetromino that was among the latest few, a limited number of times. The history
+    # starts out with S and Z pieces so the game never opens with one.
+    name = 'history'
+
+    def __init__(self, rng, history: int = HISTORY_LENGTH, rolls: int = HISTORY_ROLLS):
+        self.rng = rng
+        self.rolls = rolls
+        self.history = deque(('Z', 'S') * history, maxlen=history)
+
+    def next_type(self) -> str:
+        for _ in range(self.rolls):
+            tetromino_type = self.rng.choice(TETROMINO_TYPES)
+            if tetromino_type not in self.history:
+                break
+        self.history.append(tetromino_type)
+        return tetromino_type
+
+
+RANDOMIZERS = {randomizer.name: randomizer for randomizer in (UniformRandomizer, BagRandomizer, HistoryRandomizer)}
+# Randomizers are stored and sent by their position here
+RANDOMIZER_CODES = {name: code for code, name in enumerate(RANDOMIZERS)}
+RANDOMIZER_NAMES = list(RANDOMIZERS)
+
+
+def make_randomizer(name: str, rng):
+    try:
+        return RANDOMIZERS[name](rng)
+    except KeyError:
+        raise ValueError(f'unknown randomizer {name!r}, expected one of {", ".join(RANDOMIZERS)}') from None
+
+
+class PreviewQueue:
+    # The upcoming tetromino types, a fixed number of slots refilled from the randomizer in place:
+    # head is the slot of the next tetromino, the ones after it follow round the list
+    def __init__(self, randomizer, length: int = PREVIEW_LENGTH):
+        self.randomizer = randomizer
+        self.types = [randomizer.next_type() for _ in range(length)]
+        self.head = 0
+
+    def __len__(self) -> int:
+        return len(self.types)
+
+    def __getitem__(self, index: int) -> str:
+        if not -len(self.types) <= index < len(self.types):
+            raise IndexError('preview index out of range')
+        return self.types[(self.head + index) % len(self.types)]
+
+    def __iter__(self):
+        yield from self.types[self.head:]
+        yield from self.types[:self.head]
+
+    def pop(self) -> str:
+        # Take the next tetromino type and draw a new one into the back of the queue
+        if not self.types:
+            return self.randomizer.next_type()
+        tetromino_type = self.types[self.head]
+        self.types[self.head] = self.randomizer.next_type()
+        self.head = (self.head + 1) % len(self.types)
+        return tetromino_type
+
+    def replace(self, types) -> None:
+        # Show exactly these types, in order, the queue taking on their length
+        self.types = list(types)
+        self.head = 0
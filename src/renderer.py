@@ -0,0 +1,215 @@
+import itertools
+
+import pygame
+
+from constants import *
+from assets import blit_glyphs, get_font, render_text
+from board import CELL_COLORS
+from profiler import frame_profiler
+from sprites import get_piece_sprite, get_tile_sprite
+
+# Top-left pixel of board cell (0, 0)
+BOARD_ORIGIN = (LEFT_BOUND, UPPER_BOUND)
+# Screen regions that are redrawn independently
+PLAYFIELD_RECT = pygame.Rect(LEFT_BOUND - 5, UPPER_BOUND - 5, BORDER_DIMENSIONS[0] + 10, BORDER_DIMENSIONS[1] + 10)
+HELD_RECT = pygame.Rect(HELD_POSITION, HELD_DIMENSIONS)
+UPCOMING_RECT = pygame.Rect(UPCOMING_BLOCK_POSITION, UPCOMING_DIMENSIONS)
+STATS_X = 2 * LEFT_BOUND + 4 * TILE_SIZE
+STATS_RECT = pygame.Rect(STATS_X, UPPER_BOUND * 7 + 15, WINDOW_SIZE[0] - STATS_X, WINDOW_SIZE[1] - UPPER_BOUND * 7 - 15)
+# Where the preview boxes show their tetrominos
+HELD_SPRITE_POSITION = (HELD_POSITION[0] + TILE_SIZE, HELD_POSITION[1] + TILE_SIZE)
+UPCOMING_SPRITE_POSITION = (UPCOMING_BLOCK_POSITION[0] + TILE_SIZE, UPCOMING_BLOCK_POSITION[1] + TILE_SIZE)
+UPCOMING_SPACING = 4 * TILE_SIZE
+# Upcoming tetrominos that fit in their box, a longer preview shows its first ones
+UPCOMING_PREVIEWS = UPCOMING_DIMENSIONS[1] // UPCOMING_SPACING
+STATS_COLOR = (5, 5, 5)
+# Free space under the held box where the profiling overlay goes
+PROFILE_RECT = pygame.Rect(0, HELD_POSITION[1] + HELD_DIMENSIONS[1] + TILE_SIZE, LEFT_BOUND - 10,
+                           WINDOW_SIZE[1] - HELD_POSITION[1] - HELD_DIMENSIONS[1] - TILE_SIZE)
+PROFILE_FONT_SIZE = 12
+
+
+def cell_rect(position, origin=BOARD_ORIGIN) -> pygame.Rect:
+    # The on-screen rect of a (column, row) board cell
+    return pygame.Rect(origin[0] + position[0] * TILE_SIZE, origin[1] + position[1] * TILE_SIZE, TILE_SIZE, TILE_SIZE)
+
+
+def draw_cells(screen, cells, color, origin=BOARD_ORIGIN, tile_size: int = TILE_SIZE):
+    sprite = get_tile_sprite(color, tile_size)
+    screen.blits([(sprite, (origin[0] + column * tile_size, origin[1] + row * tile_size)) for column, row in cells],
+                 False)
+
+
+def draw_tetromino(screen, tetromino, origin=BOARD_ORIGIN, tile_size: int = TILE_SIZE):
+    draw_cells(screen, tetromino.cells(), tetromino.color, origin, tile_size)
+
+
+def draw_grid(screen, start_position: tuple[int] | list[int], horizontal_size: int, vertical_size: int):
+    # Generate grid lines
+    # 10 horizontal grid boxes
+    for x in range(0, horizontal_size, TILE_SIZE):
+        # 15 vertical grid boxes
+        for y in range(0, vertical_size, TILE_SIZE):
+            grid_box = pygame.Rect(start_position[0] + x, start_position[1] + y, TILE_SIZE, TILE_SIZE)
+            pygame.draw.rect(screen, (0, 0, 0), grid_box, GRID_WIDTH)
+
+
+def create_background() -> pygame.Surface:
+    # Everything on the game screen that never changes, drawn underneath the pieces
+    background = pygame.surface.Surface(WINDOW_SIZE, 0, 32)
+    background.fill(WHITE)
+    # Render HELD text
+    held_text = render_text('HELD', 24, STATS_COLOR)
+    background.blit(held_text, [TILE_SIZE * 2, TILE_SIZE])
+    # Backgrounds of the held and upcoming tetromino boxes
+    background.fill(BLACK, HELD_RECT)
+    background.fill(BLACK, UPCOMING_RECT)
+    return background
+
+
+def create_grid_overlay() -> pygame.Surface:
+    # Grid lines and the playfield border, drawn on top of the pieces
+    overlay = pygame.surface.Surface(WINDOW_SIZE, 0, 32)
+    overlay.fill(TRANSPARENT)
+    overlay.set_colorkey(TRANSPARENT)
+    draw_grid(overlay, HELD_POSITION, HELD_DIMENSIONS[0], HELD_DIMENSIONS[1])
+    draw_grid(overlay, UPCOMING_BLOCK_POSITION, UPCOMING_DIMENSIONS[0], UPCOMING_DIMENSIONS[1])
+    draw_grid(overlay, BOARD_ORIGIN, BORDER_DIMENSIONS[0], BORDER_DIMENSIONS[1])
+    # Create a border around the grid
+    pygame.draw.rect(overlay, (0, 0, 0), PLAYFIELD_RECT, 5)
+    return overlay
+
+
+class StackLayer:
+    # The placed tiles of a board kept drawn on a see-through surface, where only the rows that
+    # changed are redrawn
+    def __init__(self, columns: int = BOARD_COLUMNS, rows: int = BOARD_ROWS, tile_size: int = TILE_SIZE):
+        self.tile_size = tile_size
+        self.surface = pygame.surface.Surface((columns * tile_size, rows * tile_size), 0, 32)
+        self.surface.fill(TRANSPARENT)
+        self.surface.set_colorkey(TRANSPARENT)
+        self.reset()
+
+    def reset(self) -> None:
+        # Forget what was drawn, so the next update draws every row
+        # The cells of each row as last drawn, and which board they were drawn from
+        self.rows = []
+        self.key = None
+        # Pixel row where the highest placed tile starts, nothing above it needs blitting
+        self.top = self.surface.get_height()
+
+    def update(self, board, version=None) -> None:
+        # The placed tiles only change when a tetromino locks, lines clear or garbage comes in,
+        # all of which change the board's hash or the version given along with it
+        key = (board.zobrist, version)
+        if key == self.key:
+            return
+        self.key = key
+        if len(self.rows) != board.rows:
+            self.rows = [None] * board.rows
+        size = self.tile_size
+        for row in range(board.rows):
+            cells = board.cells[row * board.columns:(row + 1) * board.columns]
+            if cells == self.rows[row]:
+                continue
+            self.rows[row] = cells
+            y = row * size
+            self.surface.fill(TRANSPARENT, (0, y, self.surface.get_width(), size))
+            self.surface.blits([(get_tile_sprite(CELL_COLORS[code], size), (column * size, y))
+                                for column, code in enumerate(cells) if code], False)
+        self.top = next((row * size for row, mask in enumerate(board.row_masks) if mask), self.surface.get_height())
+
+    def blit(self, screen, origin) -> None:
+        width, height = self.surface.get_size()
+        screen.blit(self.surface, (origin[0], origin[1] + self.top), (0, self.top, width, height - self.top))
+
+
+class Renderer:
+    def __init__(self, screen, dirty_rects=True):
+        self.screen = screen
+        # Only redraw and update the parts of the screen that changed since the last frame
+        self.dirty_rects = dirty_rects
+        # Static layers, rendered once
+        self.background = create_background()
+        self.grid_overlay = create_grid_overlay()
+        # What each screen region showed when it was last drawn
+        self.drawn = {}
+        # The placed tiles, kept drawn on a see-through layer
+        self.stack = StackLayer()
+
+    def draw(self, state) -> list[pygame.Rect]:
+        # Draw the game and return the rects of the screen that changed
+        current = state.current_tetromino
+        regions = [
+            (PLAYFIELD_RECT, self.draw_playfield,
+             (state.tetrominos_placed, current.type, current.rotation, current.x, current.y)),
+            (HELD_RECT, self.draw_held, state.held_tetromino and state.held_tetromino.type),
+            (UPCOMING_RECT, self.draw_upcoming, tuple(itertools.islice(state.preview, UPCOMING_PREVIEWS))),
+            (STATS_RECT, self.draw_stats, (round(state.time_elapsed / 1000, 2), state.tetrominos_placed, state.score)),
+        ]
+        if not self.drawn or not self.dirty_rects:
+            self.screen.blit(self.background, (0, 0))
+            self.drawn = {}
+        dirty = [] if self.drawn else [self.screen.get_rect()]
+        for rect, draw, contents in regions:
+            if draw in self.drawn and self.drawn[draw] == contents:
+                continue
+            self.drawn[draw] = contents
+            # Restore the background under the region, draw its contents and the grid on top
+            self.screen.set_clip(rect)
+            self.screen.blit(self.background, rect, rect)
+            draw(state)
+            self.screen.blit(self.grid_overlay, rect, rect)
+            self.screen.set_clip(None)
+            dirty.append(rect)
+            frame_profiler.mark(draw.__name__)
+        return dirty if self.dirty_rects else [self.screen.get_rect()]
+
+    def draw_profile(self, profiler, latency=None) -> pygame.Rect:
+        # Show the rolling p50/p99 time of every phase of the frame, and of key presses reaching the display
+        self.screen.blit(self.background, PROFILE_RECT, PROFILE_RECT)
+        font = get_font(FONT_PATH, PROFILE_FONT_SIZE)
+        x, y = PROFILE_RECT.x + 4, PROFILE_RECT.y
+        self.screen.blit(font.render('phase  p50  p99 (ms)', True, STATS_COLOR), (x, y))
+        lines = list(profiler.percentiles().items())
+        if latency is not None:
+            lines.append(('input', latency.percentiles()))
+        for phase, (p50, p99) in lines:
+            y += font.get_linesize()
+            line = f'{phase.removeprefix("draw_")} {p50 * 1000:.2f} {p99 * 1000:.2f}'
+            self.screen.blit(font.render(line, True, STATS_COLOR), (x, y))
+        return PROFILE_RECT
+
+    def draw_playfield(self, state):
+        # Draw the placed tiles
+        self.stack.update(state.board, state.tetrominos_placed)
+        self.stack.blit(self.screen, BOARD_ORIGIN)
+        # Draw the shadow tetromino underneath the falling tetromino
+        current = state.current_tetromino
+        draw_cells(self.screen, current.ghost_cells(state.board), current.shadow_color)
+        # Draw the current falling tetromino
+        draw_tetromino(self.screen, current)
+
+    def draw_held(self, state):
+        # Show the held tetromino
+        if state.held_tetromino is not None:
+            self.screen.blit(get_piece_sprite(state.held_tetromino.type), HELD_SPRITE_POSITION)
+
+    def draw_upcoming(self, state):
+        # Place all the upcoming tetrominos in their box
+        x, y = UPCOMING_SPRITE_POSITION
+        for tetromino_type in itertools.islice(state.preview, UPCOMING_PREVIEWS):
+            self.screen.blit(get_piece_sprite(tetromino_type), (x, y))
+            y += UPCOMING_SPACING
+
+    def draw_stats(self, state):
+        # Show a timer in seconds, built from cached digits since it changes every frame
+        timer_y = UPPER_BOUND * 7 + 15
+        x = blit_glyphs(self.screen, str(round(state.time_elapsed / 1000, 2)), (STATS_X, timer_y), 24, STATS_COLOR)
+        self.screen.blit(render_text(' seconds', 24, STATS_COLOR), (x, timer_y))
+        # Show the placed piece count
+        piece_count = render_text(str(state.tetrominos_placed) + ' pieces placed', 24, STATS_COLOR)
+        self.screen.blit(piece_count, [STATS_X, UPPER_BOUND * 8 - 20])
+        # Show the score
+        score_count = render_text('score: ' + str(state.score), 24, STATS_COLOR)
+        self.screen.blit(score_count, [STATS_X, UPPER_BOUND * 8 + 10])
@@ -0,0 +1,172 @@
+import argparse
+import hashlib
+import random
+import struct
+import sys
+import time
+
+from game_state import *
+from randomizer import RANDOMIZER_CODES, RANDOMIZER_NAMES, RANDOMIZERS
+
+# File layout: a header, then runs of identical steps
+REPLAY_MAGIC = b'PTRP'
+REPLAY_VERSION = 3
+# magic, version, seed, randomizer, final score, tetrominos placed, step count, run count, board digest
+HEADER = struct.Struct('<4sBqBQIQI16s')
+# how many times in a row a step was taken, its dt (milliseconds) and its action
+RUN = struct.Struct('<IdB')
+
+
+class ReplayError(Exception):
+    pass
+
+
+def board_digest(board) -> bytes:
+    # A short fingerprint of which cells of the board are filled
+    packed = b''.join(mask.to_bytes((board.columns + 7) // 8, 'little') for mask in board.row_masks)
+    return hashlib.blake2b(packed, digest_size=16).digest()
+
+
+class Replay:
+    def __init__(self, seed: int, runs=None, score: int = 0, tetrominos_placed: int = 0, digest: bytes = bytes(16),
+                 randomizer: str = 'uniform'):
+        self.seed = seed
+        self.randomizer = randomizer
+        # [count, dt, action] runs, a quiet stretch of the game takes up a single run
+        self.runs = runs if runs is not None else []
+        # What the recorded game ended with
+        self.score = score
+        self.tetrominos_placed = tetrominos_placed
+        self.digest = digest
+
+    @property
+    def steps(self) -> int:
+        return sum(run[0] for run in self.runs)
+
+    @property
+    def duration(self) -> float:
+        # Milliseconds of game time the replay covers
+        return sum(count * dt for count, dt, action in self.runs)
+
+    def record(self, action: int, dt: float) -> None:
+        # Call with the arguments of every GameState.step, in order
+        if self.runs and self.runs[-1][1] == dt and self.runs[-1][2] == action:
+            self.runs[-1][0] += 1
+        else:
+            self.runs.append([1, dt, action])
+
+    def finish(self, state) -> None:
+        # Remember how the game ended so playback can be checked against it
+        self.score = state.score
+        self.tetrominos_placed = state.tetrominos_placed
+        self.digest = board_digest(state.board)
+
+    def play(self) -> GameState:
+        # Simulate the recorded game from its seed, without a window or clock
+        state = GameState(self.seed, randomizer=self.randomizer)
+        step = state.step
+        for count, dt, action in self.runs:
+            for _ in range(count):
+                step(action, dt)
+        return state
+
+    def verify(self) -> bool:
+        # Whether playing the replay back ends with the recorded score and board
+        state = self.play()
+        return (state.score == self.score and state.tetrominos_placed == self.tetrominos_placed
+                and board_digest(state.board) == self.digest)
+
+    def to_bytes(self) -> bytes:
+        header = HEADER.pack(REPLAY_MAGIC, REPLAY_VERSION, self.seed, RANDOMIZER_CODES[self.randomizer], self.score,
+                             self.tetrominos_placed, self.steps, len(self.runs), self.digest)
+        return header + b''.join(RUN.pack(count, dt, action) for count, dt, action in self.runs)
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> 'Replay':
+        if len(data) < HEADER.size:
+            raise ReplayError('replay is truncated')
+        (magic, version, seed, randomizer_code, score, tetrominos_placed, steps, run_count,
+         digest) = HEADER.unpack_from(data)
+        if magic != REPLAY_MAGIC:
+            raise ReplayError('not a replay file')
+        if version != REPLAY_VERSION:
+            raise ReplayError(f'unsupported replay version {version}')
+        if randomizer_code >= len(RANDOMIZER_NAMES):
+            raise ReplayError(f'unknown randomizer {randomizer_code}')
+        if len(data) != HEADER.size + run_count * RUN.size:
+            raise ReplayError('replay is truncated')
+        runs = [list(run) for run in RUN.iter_unpack(data[HEADER.size:])]
+        replay = cls(seed, runs, score, tetrominos_placed, digest, RANDOMIZER_NAMES[randomizer_code])
+        if replay.steps != steps:
+            raise ReplayError('replay step count does not match its runs')
+        return replay
+
+    def save(self, path: str) -> None:
+        with open(path, 'wb') as file:
+            file.write(self.to_bytes())
+
+    @classmethod
+    def load(cls, path: str) -> 'Replay':
+        with open(path, 'rb') as file:
+            return cls.from_bytes(file.read())
+
+
+def record_random_game(seed: int, dt: float = SIMULATION_STEP, max_steps: int = 100000,
+                       randomizer: str = 'uniform') -> Replay:
+    # Play a game of random key presses, for making replays to test against
+    state = GameState(seed, randomizer=randomizer)
+    replay = Replay(seed, randomizer=randomizer)
+    rng = random.Random(seed)
+    for _ in range(max_steps):
+        action = rng.choice(RANDOM_ACTIONS)
+        replay.record(action, dt)
+        state.step(action, dt)
+        if state.game_over:
+            break
+    replay.finish(state)
+    return replay
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Record and check pyTetris replays')
+    commands = parser.add_subparsers(dest='command', required=True)
+    verify = commands.add_parser('verify', help='play replays back headless and check their final score and board')
+    verify.add_argument('paths', nargs='+')
+    info = commands.add_parser('info', help='describe replays')
+    info.add_argument('paths', nargs='+')
+    record = commands.add_parser('record', help='record a game of random key presses')
+    record.add_argument('path')
+    record.add_argument('--seed', type=int, default=0)
+    record.add_argument('--randomizer', choices=RANDOMIZERS, default='uniform')
+    args = parser.parse_args()
+
+    if args.command == 'record':
+        replay = record_random_game(args.seed, randomizer=args.randomizer)
+        replay.save(args.path)
+        print(f'{args.path}: {replay.steps} steps, score {replay.score}')
+        return
+    failed = False
+    for path in args.paths:
+        try:
+            replay = Replay.load(path)
+        except (OSError, ReplayError) as error:
+            print(f'{path}: {error}')
+            failed = True
+            continue
+        description = (f'seed {replay.seed}, {replay.randomizer} randomizer, {replay.steps} steps in {len(replay.runs)} runs, '
+                       f'{replay.duration / 1000:.1f} s, score {replay.score}, '
+                       f'{replay.tetrominos_placed} pieces placed')
+        if args.command == 'info':
+            print(f'{path}: {description}')
+            continue
+        start = time.perf_counter()
+        ok = replay.verify()
+        elapsed = time.perf_counter() - start
+        print(f'{path}: {"OK" if ok else "MISMATCH"} ({description}, '
+              f'played back at {replay.duration / 1000 / elapsed:.0f}x real time)')
+        failed = failed or not ok
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,219 @@
+import os
+import time
+
+import pygame
+
+from pygame.locals import *
+
+from constants import *
+from assets import render_text
+from button import Button
+from controls import KeyRepeater, input_latency
+from game_state import *
+from profiler import frame_profiler
+from randomizer import PREVIEW_LENGTH
+from renderer import Renderer, cell_rect, draw_grid, draw_tetromino
+from replay import Replay
+
+# How long the game over screen stays up before going back to the title (milliseconds)
+GAME_OVER_DELAY = 3000
+# How often the tetrominos on the title screen fall a row (milliseconds)
+TITLE_FALL_SPEED = 100
+# Where finished games are saved as replays, nothing is saved when None
+replay_directory = None
+
+
+class Scene:
+    # Frame rate the scene runs at
+    fps = 60
+
+    def __init__(self, screen, high_score=0):
+        self.screen = screen
+        self.high_score = high_score
+        # The scene to switch to after the current frame, or None to stay on this one
+        self.next_scene = None
+
+    def handle_event(self, event) -> None:
+        pass
+
+    def update(self, dt: float) -> None:
+        pass
+
+    def draw(self) -> list[pygame.Rect]:
+        # Draw the scene and return the rects of the screen that changed
+        return [self.screen.get_rect()]
+
+
+def run_frame(scene: Scene, events, dt: float) -> tuple[Scene, list[pygame.Rect]]:
+    # Run one frame of a scene and return the scene for the next frame along with the
+    # rects to update. Scenes hand over by replacing each other here, so the old scene
+    # and everything it holds is released instead of piling up on the call stack.
+    for event in events:
+        scene.handle_event(event)
+    frame_profiler.mark('events')
+    scene.update(dt)
+    frame_profiler.mark('update')
+    dirty = scene.draw()
+    frame_profiler.mark('draw')
+    return scene.next_scene or scene, dirty
+
+
+def get_five_random_tetrominos():
+    random_tetrominos = [get_next_tetromino() for _ in range(5)]
+    count = 0
+    for tetromino in random_tetrominos:
+        tetromino.x -= int(WINDOW_SIZE[0] / (2 * TILE_SIZE)) - 4
+        tetromino.x += count * 5
+        tetromino.y -= UPPER_BOUND // TILE_SIZE + 1
+        count += 1
+    return random_tetrominos
+
+
+class TitleScene(Scene):
+    fps = 10
+
+    def __init__(self, screen, high_score=0):
+        super().__init__(screen, high_score)
+        # Create the title buttons
+        self.title_card = Button('Welcome to PyTetris!', x=180, y=70, font_size=50)
+        self.start = Button('START', x=100, y=250)
+        # options = Button('OPTIONS', x=100, y=350)
+        # Get the next tetromino
+        self.random_tetrominos = get_five_random_tetrominos()
+        self.fall_timer = 0
+        # The grid over the whole window, drawn once
+        self.grid_overlay = pygame.surface.Surface(WINDOW_SIZE, 0, 32)
+        self.grid_overlay.fill(TRANSPARENT)
+        self.grid_overlay.set_colorkey(TRANSPARENT)
+        draw_grid(self.grid_overlay, [0, 0], WINDOW_SIZE[0], WINDOW_SIZE[1])
+
+    def handle_event(self, event) -> None:
+        # START
+        if event.type == MOUSEBUTTONDOWN and event.button == 1 and self.start.rect.collidepoint(event.pos):
+            self.next_scene = PlayingScene(self.screen, self.high_score)
+        elif event.type == KEYDOWN and event.key == K_RETURN:
+            self.next_scene = PlayingScene(self.screen, self.high_score)
+        # OPTIONS
+        # if options.is_pressed():
+        #     pass
+
+    def update(self, dt: float) -> None:
+        # Move the tetrominos down a row every TITLE_FALL_SPEED milliseconds, starting over once they fall off the screen
+        self.fall_timer += dt
+        if self.fall_timer < TITLE_FALL_SPEED:
+            return
+        self.fall_timer %= TITLE_FALL_SPEED
+        for tetromino in self.random_tetrominos:
+            tetromino.move_down(check_bound=False)
+        if any(cell_rect(tetromino.cells()[0]).y > WINDOW_SIZE[1] for tetromino in self.random_tetrominos):
+            self.random_tetrominos = get_five_random_tetrominos()
+
+    def draw(self) -> list[pygame.Rect]:
+        self.screen.fill(BLACK)
+        for tetromino in self.random_tetrominos:
+            draw_tetromino(self.screen, tetromino)
+        # Draw the grid
+        self.screen.blit(self.grid_overlay, (0, 0))
+        # Display all the buttons
+        for button in [self.title_card, self.start]:
+            button.blit(self.screen)
+        return [self.screen.get_rect()]
+
+
+class PlayingScene(Scene):
+    # How games choose their tetrominos and how many upcoming ones they show
+    randomizer = 'uniform'
+    preview = PREVIEW_LENGTH
+
+    def __init__(self, screen, high_score=0):
+        super().__init__(screen, high_score)
+        self.state = GameState(randomizer=self.randomizer, preview=self.preview)
+        self.replay = Replay(self.state.seed, randomizer=self.randomizer)
+        self.renderer = Renderer(screen)
+        self.input = KeyRepeater()
+        # Game time simulated so far, and time that has passed but not been simulated yet (milliseconds)
+        self.time = 0
+        self.unsimulated_time = 0
+        # Whether the frame timings are shown, toggled with F3
+        self.show_profile = False
+
+    def handle_event(self, event) -> None:
+        if event.type == KEYDOWN and event.key == K_F3:
+            self.show_profile = not self.show_profile
+            if self.show_profile:
+                frame_profiler.enable()
+            else:
+                # Hide the overlay again, and stop timing unless --profile is tracing every frame
+                self.renderer.drawn = {}
+                if frame_profiler.trace is None:
+                    frame_profiler.disable()
+        else:
+            # Game keys, stamped with the start of the next step
+            self.input.handle_event(event, self.time)
+
+    def update(self, dt: float) -> None:
+        # Advance the game in fixed steps to catch up with the time the last frame took
+        self.unsimulated_time += min(dt, MAX_FRAME_TIME)
+        while self.unsimulated_time >= SIMULATION_STEP and not self.state.game_over:
+            self.unsimulated_time -= SIMULATION_STEP
+            self.input.run_step(self.state, self.time + SIMULATION_STEP, self.simulate_action)
+            self.time += SIMULATION_STEP
+        # Check if the game is over
+        if self.state.game_over:
+            self.save_replay()
+            self.next_scene = GameOverScene(self.screen, self.state, max(self.high_score, self.state.score))
+
+    def simulate_action(self, action: int, dt: float) -> None:
+        self.replay.record(action, dt)
+        self.state.step(action, dt)
+
+    def save_replay(self) -> None:
+        self.replay.finish(self.state)
+        if replay_directory is not None:
+            os.makedirs(replay_directory, exist_ok=True)
+            name = f'{time.strftime("%Y%m%d-%H%M%S")}-{self.state.seed}.replay'
+            self.replay.save(os.path.join(replay_directory, name))
+
+    def draw(self) -> list[pygame.Rect]:
+        # Display the parts of the game that changed
+        dirty = self.renderer.draw(self.state)
+        if self.show_profile and frame_profiler.enabled:
+            dirty.append(self.renderer.draw_profile(frame_profiler, input_latency))
+            frame_profiler.mark('profile_overlay')
+        return dirty
+
+
+class GameOverScene(Scene):
+    def __init__(self, screen, state, high_score=0):
+        super().__init__(screen, high_score)
+        self.score = state.score
+        self.time_shown = 0
+        self.drawn = False
+
+    def handle_event(self, event) -> None:
+        # Skip straight back to the title
+        if event.type in (KEYDOWN, MOUSEBUTTONDOWN):
+            self.next_scene = TitleScene(self.screen, self.high_score)
+
+    def update(self, dt: float) -> None:
+        self.time_shown += dt
+        if self.time_shown >= GAME_OVER_DELAY and self.next_scene is None:
+            self.next_scene = TitleScene(self.screen, self.high_score)
+
+    def draw(self) -> list[pygame.Rect]:
+        # The final board stays on screen underneath, so the banner is drawn once
+        if self.drawn:
+            return []
+        self.drawn = True
+        lines = [render_text('GAME OVER', 48, WHITE),
+                 render_text('score: ' + str(self.score), 24, WHITE),
+                 render_text('high score: ' + str(self.high_score), 24, WHITE)]
+        banner = pygame.Rect(0, 0, max(line.get_width() for line in lines) + 2 * TILE_SIZE,
+                             sum(line.get_height() for line in lines) + 2 * TILE_SIZE)
+        banner.center = self.screen.get_rect().center
+        self.screen.fill(BLACK, banner)
+        y = banner.y + TILE_SIZE
+        for line in lines:
+            self.screen.blit(line, (banner.centerx - line.get_width() // 2, y))
+            y += line.get_height()
+        return [banner]
@@ -0,0 +1,379 @@
+import argparse
+import heapq
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import NamedTuple
+
+from constants import *
+from board import Board
+from game_state import *
+from profiler import percentile
+from randomizer import PREVIEW_LENGTH, RANDOMIZERS
+from snapshot import TranspositionCache
+from tetromino import ROTATION_STATES, SPAWN_ORIGINS
+
+
+class Weights(NamedTuple):
+    # How much each feature of a board counts towards its value
+    height: float = -0.51  # sum of the column heights
+    holes: float = -0.36  # empty cells with a placed tile somewhere above them
+    bumpiness: float = -0.18  # height differences between neighboring columns
+    score: float = 0.0076  # points scored on the way to the board (0.76 per single line)
+
+
+DEFAULT_WEIGHTS = Weights()
+# Default beam width and tetrominos placed ahead, so that a decision fits in a 16 ms frame: on one core
+# p50 7-9 ms and p99 13-15.7 ms, where a beam of 4 through the whole preview took p50 15 ms and p99 33 ms
+# for the same play. Worker processes do not help at this size, with a beam of 4 they doubled the p50.
+DEFAULT_BEAM_WIDTH = 2
+DEFAULT_DEPTH = 2
+# Empty rows a tetromino needs under its spawn position to turn into every rotation
+SKY_ROTATION_ROWS = 4
+# Rows of the empty space above the stack searched one by one
+SKY_SEARCH_ROWS = 1
+# Placements remembered for the most recently searched positions, in every process
+EXPANSION_CACHE_SIZE = 4096
+
+
+expansion_cache = TranspositionCache(EXPANSION_CACHE_SIZE)
+
+
+class Placement(NamedTuple):
+    tetromino_type: str
+    # Where the tetromino lands
+    rotation: int
+    x: int
+    y: int
+    # The actions that take the tetromino there, ending with a hard drop, and the
+    # (rotation, x, y) the tetromino should be at before each of them
+    actions: tuple = ()
+    positions: tuple = ()
+    # Whether the tetromino is swapped with the hold slot first
+    hold: bool = False
+
+    def cells(self) -> list[tuple[int, int]]:
+        orientation = ROTATION_STATES[self.tetromino_type][self.rotation]
+        return [(self.x + column, self.y + row) for column, row in orientation.cells]
+
+
+class Node(NamedTuple):
+    # A board reached by the search, and the pieces left to place on it
+    value: float
+    points: int
+    row_masks: tuple
+    zobrist: int
+    tetromino_type: str | None
+    held_type: str | None
+    queue_position: int
+    can_hold: bool
+    # The placement made at the root that led here
+    first: Placement | None
+
+
+def enumerate_placements(board, tetromino_type: str, start=None, track_actions=True) -> list[Placement]:
+    # Every distinct final placement the tetromino can reach from its start (rotation, x, y),
+    # the spawn position by default, with the moves and rotations of Tetromino.
+    # Placements covering the same cells are counted once, with the shortest action sequence.
+    states = ROTATION_STATES[tetromino_type]
+    if start is None:
+        start = (0, *SPAWN_ORIGINS[tetromino_type])
+    if not board.fits(states[start[0]], start[1], start[2]):
+        return []
+    can_rotate = tetromino_type != 'O'
+    fits = board.fits
+    # Nothing blocks a tetromino above the stack, so there it can reach any rotation and column.
+    # Without actions to track, start from just above the stack instead of searching the empty
+    # rows one by one.
+    starts = [] if track_actions else sky_positions(board, tetromino_type, start)
+    starts = starts or [start]
+    parents = dict.fromkeys(starts)
+    queue = deque(starts)
+    placements = {}
+    while queue:
+        position = queue.popleft()
+        rotation, x, y = position
+        orientation = states[rotation]
+        # Lock the tetromino here (moving down is impossible) or hard drop it from here
+        if track_actions:
+            landing = y + board.drop_distance(orientation, x, y)
+        elif not fits(orientation, x, y + 1):
+            landing = y
+        else:
+            landing = None
+        if landing is not None:
+            # The covered cells as one number, with a row of bits per board row
+            left = x + orientation.left
+            key = sum(mask << (left + (landing + row_offset) * board.columns)
+                      for row_offset, mask in orientation.row_masks)
+            if key not in placements:
+                placements[key] = (rotation, x, landing, position)
+        # Try every move from here
+        for move, next_position in ((MOVE_LEFT, (rotation, x - 1, y)), (MOVE_RIGHT, (rotation, x + 1, y)),
+                                    (SOFT_DROP, (rotation, x, y + 1))):
+            if next_position not in parents and fits(orientation, next_position[1], next_position[2]):
+                parents[next_position] = (position, move)
+                queue.append(next_position)
+        if can_rotate:
+            next_rotation = (rotation + 1) % 4
+            for offset_x, offset_y in orientation.kicks:
+                if fits(states[next_rotation], x + offset_x, y + offset_y):
+                    next_position = (next_rotation, x + offset_x, y + offset_y)
+                    if next_position not in parents:
+                        parents[next_position] = (position, ROTATE)
+                        queue.append(next_position)
+                    break
+    results = []
+    for rotation, x, landing, position in placements.values():
+        actions, positions = (), ()
+        if track_actions:
+            # Walk back to the start
+            actions, positions = [HARD_DROP], [position]
+            while parents[position] is not None:
+                position, move = parents[position]
+                actions.append(move)
+                positions.append(position)
+            actions, positions = tuple(reversed(actions)), tuple(reversed(positions))
+        results.append(Placement(tetromino_type, rotation, x, landing, actions, positions))
+    return results
+
+
+def sky_positions(board, tetromino_type: str, start) -> list[tuple[int, int, int]]:
+    # The (rotation, x, y) positions in the lowest SKY_SEARCH_ROWS rows of the empty space above
+    # the stack, provided the empty space is tall enough for the tetromino to turn around in
+    stack_top = min(board.column_tops)
+    if stack_top < start[2] + SKY_ROTATION_ROWS:
+        return []
+    positions = []
+    rotations = range(4) if tetromino_type != 'O' else range(1)
+    for rotation in rotations:
+        orientation = ROTATION_STATES[tetromino_type][rotation]
+        lowest = stack_top - 1 - max(row for column, row in orientation.cells)
+        for y in range(max(start[2] + 1, lowest - SKY_SEARCH_ROWS + 1), lowest + 1):
+            for x in range(-orientation.left, board.columns - orientation.left - orientation.width + 1):
+                positions.append((rotation, x, y))
+    return positions
+
+
+def place(board, placement) -> tuple[Board, int]:
+    # A copy of the board with the placement locked in and its full lines cleared,
+    # and the points scored by them
+    board = board.copy()
+    orientation = ROTATION_STATES[placement.tetromino_type][placement.rotation]
+    board.add_orientation(orientation, placement.x, placement.y)
+    lines = board.clear_lines(placement.y + row_offset for row_offset, mask in orientation.row_masks)
+    return board, get_line_points(len(lines))
+
+
+def board_features(board) -> tuple[int, int, int]:
+    # The aggregate height, holes and bumpiness of a board
+    heights = board.column_heights()
+    holes = 0
+    covered = 0
+    for mask in board.row_masks:
+        holes += (covered & ~mask).bit_count()
+        covered |= mask
+    bumpiness = sum(abs(left - right) for left, right in zip(heights, heights[1:]))
+    return sum(heights), holes, bumpiness
+
+
+def value(features, weights: Weights, points: int) -> float:
+    height, holes, bumpiness = features
+    return weights.height * height + weights.holes * holes + weights.bumpiness * bumpiness + weights.score * points
+
+
+def evaluate(board, weights: Weights = DEFAULT_WEIGHTS, points: int = 0) -> float:
+    return value(board_features(board), weights, points)
+
+
+def placement_outcomes(board, tetromino_type: str, start, track_actions: bool) -> list[tuple]:
+    # The (placement, row masks, zobrist hash, points, features) of every placement that doesn't top out,
+    # remembered for the positions seen most recently
+    key = (board.zobrist, tetromino_type, start, track_actions)
+    outcomes = expansion_cache.get(key)
+    if outcomes is None:
+        outcomes = []
+        for placement in enumerate_placements(board, tetromino_type, start, track_actions):
+            next_board, points = place(board, placement)
+            # Topping out is never worth it
+            if any(next_board.row_masks[row] for row in range(TOP_OUT_ROWS)):
+                continue
+            outcomes.append((placement, tuple(next_board.row_masks), next_board.zobrist, points,
+                             board_features(next_board)))
+        expansion_cache.put(key, outcomes)
+    return outcomes
+
+
+def expand(board, node: Node, options, queue, weights: Weights, track_actions: bool) -> list[Node]:
+    # The nodes reached by placing each (tetromino type, held type, queue position, hold, start) option
+    children = []
+    for tetromino_type, held_type, queue_position, hold, start, prefix in options:
+        next_type = queue[queue_position] if queue_position < len(queue) else None
+        for placement, row_masks, zobrist, points, features in placement_outcomes(board, tetromino_type, start,
+                                                                                  track_actions):
+            first = node.first
+            if first is None:
+                first = placement._replace(actions=prefix[0] + placement.actions,
+                                           positions=prefix[1] + placement.positions, hold=hold)
+            total = node.points + points
+            children.append(Node(value(features, weights, total), total, row_masks, zobrist,
+                                 next_type, held_type, queue_position + 1, True, first))
+    return children
+
+
+def expand_node(node: Node, queue, weights: Weights, columns: int = BOARD_COLUMNS) -> list[Node]:
+    # Place the node's tetromino, or swap it with the hold slot first, as the game would
+    board = Board.from_row_masks(node.row_masks, columns, node.zobrist)
+    options = [(node.tetromino_type, node.held_type, node.queue_position, False, None, ((), ()))]
+    if node.can_hold:
+        if node.held_type is None:
+            if node.queue_position < len(queue):
+                options.append((queue[node.queue_position], node.tetromino_type, node.queue_position + 1, True,
+                                None, ((), ())))
+        else:
+            # Using the held piece empties the hold slot and discards the current one
+            options.append((node.held_type, None, node.queue_position, True, None, ((), ())))
+    return expand(board, node, options, queue, weights, track_actions=False)
+
+
+def expand_nodes(nodes, queue, weights: Weights, columns: int = BOARD_COLUMNS) -> list[Node]:
+    return [child for node in nodes for child in expand_node(node, queue, weights, columns)]
+
+
+class PlacementSearch:
+    def __init__(self, weights: Weights = DEFAULT_WEIGHTS, beam_width: int = DEFAULT_BEAM_WIDTH,
+                 depth: int | None = DEFAULT_DEPTH, workers: int = 0):
+        self.weights = weights
+        self.beam_width = beam_width
+        # How many pieces are placed ahead, counting the current one, or None for every upcoming one
+        self.depth = depth
+        # Expanding the beam runs on this many processes, or in this process when 0
+        self.workers = workers
+        self.pool = ProcessPoolExecutor(workers) if workers else None
+
+    def close(self) -> None:
+        if self.pool is not None:
+            self.pool.shutdown()
+            self.pool = None
+
+    def root_nodes(self, state) -> list[Node]:
+        # The placements of the current tetromino, and of the one swapped in by holding it
+        current = state.current_tetromino
+        queue = list(state.preview)
+        held_type = state.held_tetromino and state.held_tetromino.type
+        start = (current.rotation, current.x, current.y)
+        options = [(current.type, held_type, 0, False, start, ((), ()))]
+        if not state.using_held_piece:
+            prefix = ((HOLD,), (start,))
+            # Holding into an empty slot brings out the next tetromino, when the preview shows it
+            if held_type is None and queue:
+                options.append((queue[0], current.type, 1, True, None, prefix))
+            elif held_type is not None:
+                options.append((held_type, None, 0, True, None, prefix))
+        root = Node(0, 0, tuple(state.board.row_masks), state.board.zobrist, current.type, held_type, 0, False, None)
+        return expand(state.board, root, options, queue, self.weights, track_actions=True)
+
+    def expand_all(self, nodes, queue) -> list[Node]:
+        if self.pool is None or len(nodes) < 2:
+            return expand_nodes(nodes, queue, self.weights)
+        chunks = [nodes[worker::self.workers] for worker in range(self.workers)]
+        results = self.pool.map(expand_nodes, [chunk for chunk in chunks if chunk],
+                                [queue] * len(chunks), [self.weights] * len(chunks))
+        return [child for children in results for child in children]
+
+    def best_placement(self, state) -> Placement | None:
+        # The best first placement found by a beam search through the upcoming tetrominos
+        queue = list(state.preview)
+        depth = len(queue) + 1 if self.depth is None else self.depth
+        beam = self.prune(self.root_nodes(state))
+        for _ in range(depth - 1):
+            frontier = [node for node in beam if node.tetromino_type is not None]
+            children = self.expand_all(frontier, queue)
+            if not children:
+                break
+            beam = self.prune(children + [node for node in beam if node.tetromino_type is None])
+        if not beam:
+            return None
+        return max(beam, key=lambda node: node.value).first
+
+    def prune(self, nodes) -> list[Node]:
+        # Keep the best node for every position, then the best positions
+        best = {}
+        for node in nodes:
+            key = (node.zobrist, node.tetromino_type, node.held_type, node.queue_position)
+            if key not in best or node.value > best[key].value:
+                best[key] = node
+        return heapq.nlargest(self.beam_width, best.values(), key=lambda node: node.value)
+
+
+class Bot:
+    # Plays a game one action per step, following the best placement of each tetromino
+    def __init__(self, search: PlacementSearch):
+        self.search = search
+        # Which tetromino the plan is for: the pieces placed before it and whether it came from the hold,
+        # as the game reuses the same objects for new tetrominos
+        self.tetromino = None
+        self.plan = []
+        # Seconds each search took
+        self.decision_times = []
+
+    def needs_plan(self, state) -> bool:
+        # Whether the next act searches: for a new tetromino, or when gravity moved it off the plan
+        current = state.current_tetromino
+        return ((state.tetrominos_placed, state.using_held_piece) != self.tetromino or not self.plan
+                or self.plan[0][1] != (current.rotation, current.x, current.y))
+
+    def act(self, state) -> int:
+        if self.needs_plan(state):
+            self.tetromino = (state.tetrominos_placed, state.using_held_piece)
+            start = time.perf_counter()
+            placement = self.search.best_placement(state)
+            self.decision_times.append(time.perf_counter() - start)
+            if placement is None:
+                return HARD_DROP
+            self.plan = list(zip(placement.actions, placement.positions))
+        return self.plan.pop(0)[0]
+
+
+def play_game(bot: Bot, seed: int | None = None, dt: float = SIMULATION_STEP, max_pieces: int | None = None,
+              gravity: Gravity = DEFAULT_GRAVITY, action_delay: int = 0, randomizer: str = 'uniform',
+              preview: int = PREVIEW_LENGTH):
+    # Let the bot play a game headless, one action per step followed by action_delay idle steps
+    state = GameState(seed, gravity, randomizer, preview)
+    lines = 0
+    while not state.game_over and (max_pieces is None or state.tetrominos_placed < max_pieces):
+        lines += state.step(bot.act(state), dt)
+        for _ in range(action_delay):
+            if state.game_over:
+                break
+            lines += state.step(NO_OP, dt)
+    return state, lines
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Let the placement search play a game headless')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--pieces', type=int, default=200, help='stop after placing this many tetrominos')
+    parser.add_argument('--beam', type=int, default=DEFAULT_BEAM_WIDTH, help='beam width')
+    parser.add_argument('--depth', type=int, default=DEFAULT_DEPTH,
+                        help='tetrominos placed ahead, counting the current one (0 for the whole preview)')
+    parser.add_argument('--workers', type=int, default=0, help='processes expanding the beam')
+    parser.add_argument('--randomizer', choices=RANDOMIZERS, default='uniform', help='how tetrominos are chosen')
+    parser.add_argument('--preview', type=int, default=PREVIEW_LENGTH, help='upcoming tetrominos shown')
+    args = parser.parse_args()
+    search = PlacementSearch(beam_width=args.beam, depth=args.depth or None, workers=args.workers)
+    bot = Bot(search)
+    try:
+        state, lines = play_game(bot, args.seed, max_pieces=args.pieces, randomizer=args.randomizer,
+                                 preview=args.preview)
+    finally:
+        search.close()
+    times = bot.decision_times
+    print(f'score {state.score}, {lines} lines, {state.tetrominos_placed} pieces placed, '
+          f'{"game over" if state.game_over else "still alive"}')
+    print(f'{len(times)} searches, p50 {percentile(times, 0.5) * 1000:.2f} ms, '
+          f'p99 {percentile(times, 0.99) * 1000:.2f} ms')
+
+
+if __name__ == '__main__':
+    main()
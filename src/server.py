@@ -0,0 +1,153 @@
+import argparse
+import asyncio
+import itertools
+import struct
+
+from game_state import *
+from randomizer import RANDOMIZER_NAMES
+from snapshot import take_snapshot
+
+# Every message either way is a length, then that many bytes of payload
+FRAME = struct.Struct('<I')
+# Payloads longer than this close the connection
+MAX_PAYLOAD = 1 << 16
+# Games one connection can have going at once
+MAX_SESSIONS = 1024
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 7654
+
+# Requests, told apart by their first byte
+NEW_GAME = 1
+STEP = 2
+END_GAME = 3
+# command, seed (negative for a random one), randomizer code, preview length
+NEW_GAME_REQUEST = struct.Struct('<BqBB')
+# command, session, dt (milliseconds per step), action count, followed by one byte per action
+STEP_REQUEST = struct.Struct('<BIdH')
+# command, session
+END_GAME_REQUEST = struct.Struct('<BI')
+
+# Replies start with a status, then a snapshot of the game (OK) or a UTF-8 message (ERROR)
+OK = 0
+ERROR = 1
+# status, session, game over, lines cleared by the request's steps
+REPLY = struct.Struct('<BIBH')
+ACTIONS = range(SONIC_DROP + 1)
+
+
+class ProtocolError(Exception):
+    pass
+
+
+class Connection:
+    # The games one client is playing, numbered from 1 in the order they were started
+    def __init__(self):
+        self.sessions = {}
+        self.session_ids = itertools.count(1)
+
+    def respond(self, payload: bytes) -> bytes:
+        try:
+            return self.handle(payload)
+        except ProtocolError as error:
+            return REPLY.pack(ERROR, 0, False, 0) + str(error).encode()
+
+    def handle(self, payload: bytes) -> bytes:
+        if not payload:
+            raise ProtocolError('empty request')
+        command = payload[0]
+        if command == NEW_GAME:
+            return self.new_game(payload)
+        if command == STEP:
+            return self.step(payload)
+        if command == END_GAME:
+            if len(payload) != END_GAME_REQUEST.size:
+                raise ProtocolError('malformed end game request')
+            _, session = END_GAME_REQUEST.unpack(payload)
+            self.game(session)
+            del self.sessions[session]
+            return REPLY.pack(OK, session, True, 0)
+        raise ProtocolError(f'unknown command {command}')
+
+    def game(self, session: int):
+        try:
+            return self.sessions[session]
+        except KeyError:
+            raise ProtocolError(f'no session {session}') from None
+
+    def new_game(self, payload: bytes) -> bytes:
+        if len(payload) != NEW_GAME_REQUEST.size:
+            raise ProtocolError('malformed new game request')
+        _, seed, randomizer, preview = NEW_GAME_REQUEST.unpack(payload)
+        if randomizer >= len(RANDOMIZER_NAMES):
+            raise ProtocolError(f'unknown randomizer {randomizer}')
+        if len(self.sessions) >= MAX_SESSIONS:
+            raise ProtocolError(f'more than {MAX_SESSIONS} games at once')
+        state = GameState(None if seed < 0 else seed, randomizer=RANDOMIZER_NAMES[randomizer], preview=preview)
+        session = next(self.session_ids)
+        self.sessions[session] = state
+        return REPLY.pack(OK, session, False, 0) + take_snapshot(state).to_bytes()
+
+    def step(self, payload: bytes) -> bytes:
+        if len(payload) < STEP_REQUEST.size:
+            raise ProtocolError('malformed step request')
+        _, session, dt, count = STEP_REQUEST.unpack_from(payload)
+        actions = payload[STEP_REQUEST.size:]
+        if len(actions) != count:
+            raise ProtocolError(f'expected {count} actions, got {len(actions)}')
+        if any(action not in ACTIONS for action in actions):
+            raise ProtocolError('unknown action')
+        state = self.game(session)
+        # Apply the actions one step each, stopping at the end of the game
+        lines = 0
+        for action in actions:
+            if state.game_over:
+                break
+            lines += state.step(action, dt)
+        return REPLY.pack(OK, session, state.game_over, lines) + take_snapshot(state).to_bytes()
+
+
+async def serve_connection(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+    # Answer requests in the order they arrive until the client hangs up
+    connection = Connection()
+    try:
+        while True:
+            (length,) = FRAME.unpack(await reader.readexactly(FRAME.size))
+            if length > MAX_PAYLOAD:
+                break
+            reply = connection.respond(await reader.readexactly(length))
+            writer.write(FRAME.pack(len(reply)) + reply)
+            await writer.drain()
+    except (asyncio.IncompleteReadError, ConnectionError):
+        pass
+    finally:
+        writer.close()
+
+
+async def start_server(path: str | None = None, host: str = DEFAULT_HOST, port: int = DEFAULT_PORT):
+    # Listen on a Unix socket when given its path, otherwise on TCP
+    if path is not None:
+        return await asyncio.start_unix_server(serve_connection, path)
+    return await asyncio.start_server(serve_connection, host, port)
+
+
+async def run(path: str | None, host: str, port: int) -> None:
+    server = await start_server(path, host, port)
+    print(f'listening on {path or f"{host}:{port}"}')
+    async with server:
+        await server.serve_forever()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Host headless games for clients on a Unix socket or local TCP port')
+    parser.add_argument('--unix', metavar='PATH', help='listen on this Unix socket instead of TCP')
+    parser.add_argument('--host', default=DEFAULT_HOST)
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    args = parser.parse_args()
+    try:
+        asyncio.run(run(args.unix, args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,173 @@
+import struct
+from collections import OrderedDict
+from typing import NamedTuple
+
+from constants import *
+from board import CODE_TYPES, TYPE_CODES, Board, zobrist_key
+from game_state import GameState, get_tick_speed
+from tetromino import Tetromino
+
+# Tetromino types are stored as their cell codes, 0 meaning none
+# columns, rows, piece (type, rotation, x, y, is_placed), held (type, is_placed), using held piece,
+# queue length, pending garbage count, score, tetrominos placed, prior elapsed, time elapsed, place block timer,
+# zobrist hash
+SNAPSHOT_HEADER = struct.Struct('<BBBBbbBBBBBBQIdddQ')
+# Byte translation tables for packing cell codes two to a byte and back
+HIGH_NIBBLE = bytes((code << 4) & 0xFF for code in range(256))
+LOW_CODE = bytes(byte & 15 for byte in range(256))
+HIGH_CODE = bytes(byte >> 4 for byte in range(256))
+# Positions kept by default in a TranspositionCache
+TRANSPOSITION_CACHE_SIZE = 65536
+
+
+class Snapshot(NamedTuple):
+    columns: int
+    rows: int
+    # One bitmask per row, as on the board
+    row_masks: tuple
+    # The cell code of every cell, row by row
+    cells: bytes
+    # (type, rotation, x, y, is_placed) of the falling tetromino
+    piece: tuple
+    # (type, is_placed) of the held tetromino, or None
+    held: tuple | None
+    using_held_piece: bool
+    queue: tuple
+    # (lines, hole column) of the garbage waiting to be pushed into the board, oldest first
+    pending_garbage: tuple
+    score: int
+    tetrominos_placed: int
+    # prior_elapsed, time_elapsed and place_block_timer
+    timers: tuple
+    zobrist: int
+
+    def to_bytes(self) -> bytes:
+        # The cells packed two to a byte after the header, the queue, the pending garbage and the row masks
+        row_size = (self.columns + 7) // 8
+        held_type, held_is_placed = self.held if self.held is not None else (None, False)
+        piece_type, rotation, x, y, is_placed = self.piece
+        header = SNAPSHOT_HEADER.pack(self.columns, self.rows, TYPE_CODES[piece_type], rotation, x, y, is_placed,
+                                      TYPE_CODES.get(held_type, 0), held_is_placed, self.using_held_piece,
+                                      len(self.queue), len(self.pending_garbage), self.score, self.tetrominos_placed,
+                                      *self.timers, self.zobrist)
+        cells = self.cells + bytes(len(self.cells) % 2)
+        # Even cells in the low nibbles, odd cells in the high ones, or-ed together as one big integer
+        packed = int.from_bytes(cells[0::2], 'little') | int.from_bytes(cells[1::2].translate(HIGH_NIBBLE), 'little')
+        packed_cells = packed.to_bytes(len(cells) // 2, 'little')
+        return (header + bytes(TYPE_CODES[tetromino_type] for tetromino_type in self.queue)
+                + bytes(value for garbage in self.pending_garbage for value in garbage)
+                + b''.join(mask.to_bytes(row_size, 'little') for mask in self.row_masks) + packed_cells)
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> 'Snapshot':
+        (columns, rows, piece_code, rotation, x, y, is_placed, held_code, held_is_placed, using_held_piece,
+         queue_length, garbage_count, score, tetrominos_placed, prior_elapsed, time_elapsed, place_block_timer,
+         zobrist) = SNAPSHOT_HEADER.unpack_from(data)
+        offset = SNAPSHOT_HEADER.size
+        queue = tuple(CODE_TYPES[code] for code in data[offset:offset + queue_length])
+        offset += queue_length
+        garbage = data[offset:offset + 2 * garbage_count]
+        pending_garbage = tuple(zip(garbage[0::2], garbage[1::2]))
+        offset += 2 * garbage_count
+        row_size = (columns + 7) // 8
+        row_masks = tuple(int.from_bytes(data[offset + row * row_size:offset + (row + 1) * row_size], 'little')
+                          for row in range(rows))
+        offset += rows * row_size
+        packed_cells = data[offset:]
+        cells = bytearray(2 * len(packed_cells))
+        cells[0::2] = packed_cells.translate(LOW_CODE)
+        cells[1::2] = packed_cells.translate(HIGH_CODE)
+        cells = bytes(cells[:columns * rows])
+        held = (CODE_TYPES[held_code], bool(held_is_placed)) if held_code else None
+        return cls(columns, rows, row_masks, cells, (CODE_TYPES[piece_code], rotation, x, y, bool(is_placed)), held,
+                   bool(using_held_piece), queue, pending_garbage, score, tetrominos_placed,
+                   (prior_elapsed, time_elapsed, place_block_timer), zobrist)
+
+
+def position_hash(board, piece: tuple, held: tuple | None, using_held_piece: bool, queue,
+                  pending_garbage=()) -> int:
+    # Zobrist hash of a whole position: the board's, with keys for the pieces and the pending garbage mixed in
+    zobrist = board.zobrist ^ zobrist_key('piece', *piece[:4])
+    if held is not None:
+        zobrist ^= zobrist_key('held', held[0])
+    if using_held_piece:
+        zobrist ^= zobrist_key('using held piece')
+    for position, tetromino_type in enumerate(queue):
+        zobrist ^= zobrist_key('queue', position, tetromino_type)
+    for position, (lines, hole) in enumerate(pending_garbage):
+        zobrist ^= zobrist_key('garbage', position, lines, hole)
+    return zobrist
+
+
+def take_snapshot(state) -> Snapshot:
+    board = state.board
+    current = state.current_tetromino
+    piece = (current.type, current.rotation, current.x, current.y, current.is_placed)
+    held = state.held_tetromino and (state.held_tetromino.type, state.held_tetromino.is_placed)
+    queue = tuple(state.preview)
+    pending_garbage = tuple(state.pending_garbage)
+    return Snapshot(board.columns, board.rows, tuple(board.row_masks), bytes(board.cells), piece, held,
+                    state.using_held_piece, queue, pending_garbage, state.score, state.tetrominos_placed,
+                    (state.prior_elapsed, state.time_elapsed, state.place_block_timer),
+                    position_hash(board, piece, held, state.using_held_piece, queue, pending_garbage))
+
+
+def restore_snapshot(snapshot: Snapshot, state=None) -> GameState:
+    # Put a game back as it was, into the given state or a new one. The piece generator is not
+    # part of a snapshot, the game keeps drawing new pieces from the state's own.
+    if state is None:
+        state = GameState()
+    state.board = Board.from_row_masks(snapshot.row_masks, snapshot.columns, cells=snapshot.cells)
+    piece_type, rotation, x, y, is_placed = snapshot.piece
+    state.current_tetromino = Tetromino(piece_type)
+    state.current_tetromino.rotation, state.current_tetromino.x, state.current_tetromino.y = rotation, x, y
+    state.current_tetromino.is_placed = is_placed
+    state.held_tetromino = None
+    if snapshot.held is not None:
+        state.held_tetromino = Tetromino(snapshot.held[0])
+        state.held_tetromino.is_placed = snapshot.held[1]
+    state.using_held_piece = snapshot.using_held_piece
+    state.preview.replace(snapshot.queue)
+    state.pending_garbage = list(snapshot.pending_garbage)
+    state.score = snapshot.score
+    state.tetrominos_placed = snapshot.tetrominos_placed
+    state.tick_speed = get_tick_speed(state.score, state.gravity)
+    state.prior_elapsed, state.time_elapsed, state.place_block_timer = snapshot.timers
+    state.cleared_rows = []
+    state.game_over = any(state.board.row_masks[row] for row in range(TOP_OUT_ROWS))
+    return state
+
+
+class TranspositionCache:
+    # Remembers the values of the most recently used positions, forgetting the least recently used ones
+    def __init__(self, maxsize: int = TRANSPOSITION_CACHE_SIZE):
+        self.maxsize = maxsize
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def __contains__(self, key) -> bool:
+        return key in self.entries
+
+    def get(self, key, default=None):
+        try:
+            value = self.entries[key]
+        except KeyError:
+            self.misses += 1
+            return default
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def put(self, key, value) -> None:
+        self.entries[key] = value
+        self.entries.move_to_end(key)
+        if len(self.entries) > self.maxsize:
+            self.entries.popitem(last=False)
+
+    def clear(self) -> None:
+        self.entries.clear()
+        self.hits = self.misses = 0
@@ -0,0 +1,92 @@
+import argparse
+import gc
+import os
+import random
+import sys
+import time
+import tracemalloc
+
+# Run without a window
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+
+import pygame
+
+from pygame.locals import *
+
+from constants import *
+from controls import input_latency
+from profiler import percentile
+from scenes import *
+
+# Keys pressed while playing, weighted towards hard drops so rounds end quickly
+SOAK_KEYS = [K_SPACE, K_SPACE, K_SPACE, K_LEFT, K_RIGHT, K_UP, ord('c'), K_DOWN]
+
+
+def play_round(scene, rng, dt):
+    # Play from the title screen through a game and its game over screen back to the title,
+    # returning the new title scene and the time each frame of the game took
+    frame_times = []
+    phases = [TitleScene, PlayingScene, GameOverScene, TitleScene]
+    phase = 0
+    while phase < len(phases) - 1:
+        if isinstance(scene, TitleScene):
+            events = [pygame.event.Event(KEYDOWN, key=K_RETURN)]
+        elif isinstance(scene, PlayingScene):
+            events = [pygame.event.Event(KEYDOWN, key=rng.choice(SOAK_KEYS))]
+        else:
+            events = []
+        playing = isinstance(scene, PlayingScene)
+        start = time.perf_counter()
+        scene, dirty = run_frame(scene, events, dt)
+        input_latency.displayed()
+        if playing:
+            frame_times.append(time.perf_counter() - start)
+        if isinstance(scene, phases[phase + 1]):
+            phase += 1
+    return scene, frame_times
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Play many rounds through the scene loop and check that '
+                                                 'memory use and frame time stay flat')
+    parser.add_argument('--rounds', type=int, default=200)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--dt', type=float, default=1000 / 60, help='milliseconds per frame')
+    parser.add_argument('--warmup', type=int, default=10, help='rounds played before the baseline is taken')
+    parser.add_argument('--max-growth', type=float, default=256, help='allowed memory growth (KiB)')
+    parser.add_argument('--max-slowdown', type=float, default=2.0,
+                        help='allowed ratio between the last and first median frame times')
+    args = parser.parse_args()
+
+    pygame.init()
+    screen = pygame.display.set_mode(WINDOW_SIZE, 0, 32)
+    random.seed(args.seed)
+    rng = random.Random(args.seed)
+    scene = TitleScene(screen)
+
+    tracemalloc.start()
+    baseline_memory = baseline_frame = None
+    memory = frame = 0
+    for round_number in range(args.warmup + args.rounds):
+        scene, frame_times = play_round(scene, rng, args.dt)
+        gc.collect()
+        memory = tracemalloc.get_traced_memory()[0]
+        frame = percentile(frame_times, 0.5)
+        if round_number == args.warmup:
+            baseline_memory, baseline_frame = memory, frame
+        if round_number % 50 == 0 or round_number == args.warmup + args.rounds - 1:
+            print(f'round {round_number}: {memory / 1024:.1f} KiB traced, '
+                  f'p50 frame {frame * 1000:.3f} ms, p99 frame {percentile(frame_times, 0.99) * 1000:.3f} ms')
+    tracemalloc.stop()
+
+    growth = (memory - baseline_memory) / 1024
+    slowdown = frame / baseline_frame
+    print(f'memory growth {growth:.1f} KiB, frame time ratio {slowdown:.2f}')
+    if growth > args.max_growth or slowdown > args.max_slowdown:
+        print('FAILED')
+        sys.exit(1)
+    print('OK')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,43 @@
+import pygame
+
+from constants import *
+from tetromino import get_shadow_color
+
+# Pre-rendered tetromino images, keyed by (tetromino type, shadow, tile size)
+piece_sprites = {}
+# Pre-rendered single tiles, keyed by (color, tile size)
+tile_sprites = {}
+
+
+def render_piece_sprite(tetromino_type: str, shadow=False, size: int = TILE_SIZE) -> pygame.Surface:
+    binary_matrix = tetrominos[tetromino_type]
+    color = tetromino_colors[tetromino_type]
+    if shadow:
+        color = get_shadow_color(color)
+    # Square surface the size of the tetromino's matrix, see-through where the matrix is empty
+    sprite = pygame.surface.Surface((len(binary_matrix) * size, len(binary_matrix) * size), 0, 32)
+    sprite.fill(TRANSPARENT)
+    sprite.set_colorkey(TRANSPARENT)
+    for row in range(len(binary_matrix)):
+        for col in range(len(binary_matrix)):
+            if binary_matrix[row][col] == 1:
+                sprite.fill(color, (col * size, row * size, size, size))
+    return sprite
+
+
+def get_piece_sprite(tetromino_type: str, shadow=False, size: int = TILE_SIZE) -> pygame.Surface:
+    # The cached image of a tetromino in its spawn orientation
+    key = (tetromino_type, shadow, size)
+    if key not in piece_sprites:
+        piece_sprites[key] = render_piece_sprite(tetromino_type, shadow, size)
+    return piece_sprites[key]
+
+
+def get_tile_sprite(color: tuple, size: int = TILE_SIZE) -> pygame.Surface:
+    # The cached image of one tile of a color, for drawing many cells with a single Surface.blits
+    key = (color, size)
+    if key not in tile_sprites:
+        sprite = pygame.surface.Surface((size, size), 0, 32)
+        sprite.fill(color)
+        tile_sprites[key] = sprite
+    return tile_sprites[key]
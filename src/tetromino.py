@@ -1,149 +1,156 @@
-import copy
+from collections import namedtuple
 
 from constants import *
-from tile import Tile
+
+# Rotation kicks, (column, row) shifts tried in order when turning out of each orientation.
+# Without wall kicks a rotation only succeeds in place.
+NO_KICKS = ((0, 0),)
+SRS_KICKS = (
+    ((0, 0), (-1, 0), (-1, -1), (0, 2), (-1, 2)),
+    ((0, 0), (1, 0), (1, 1), (0, -2), (1, -2)),
+    ((0, 0), (1, 0), (1, -1), (0, 2), (1, 2)),
+    ((0, 0), (-1, 0), (-1, 1), (0, -2), (-1, -2)),
+)
+SRS_I_KICKS = (
+    ((0, 0), (-2, 0), (1, 0), (-2, 1), (1, -2)),
+    ((0, 0), (-1, 0), (2, 0), (-1, -2), (2, 1)),
+    ((0, 0), (2, 0), (-1, 0), (2, -1), (-1, 2)),
+    ((0, 0), (1, 0), (-2, 0), (1, 2), (-2, -1)),
+)
+
+
+# A plain namedtuple rather than typing.NamedTuple, importing typing would double the engine's import time.
+# cells: (column, row) offsets of the tiles from the rotation origin
+# left, width: leftmost column offset and width of the tiles
+# row_masks: (row offset, bitmask) of the tiles in each row, bit 0 being the leftmost column
+# column_bottoms: (column offset, row offset) of the lowest tile in each column
+# kicks: shifts tried when rotating into the next orientation
+Orientation = namedtuple('Orientation', ['cells', 'left', 'width', 'row_masks', 'column_bottoms', 'kicks'])
+
+
+def build_orientation(cells, kicks) -> Orientation:
+    left = min(column for column, row in cells)
+    width = max(column for column, row in cells) - left + 1
+    row_masks = {}
+    column_bottoms = {}
+    for column, row in cells:
+        row_masks[row] = row_masks.get(row, 0) | 1 << (column - left)
+        column_bottoms[column] = max(column_bottoms.get(column, row), row)
+    return Orientation(tuple(cells), left, width, tuple(sorted(row_masks.items())),
+                       tuple(sorted(column_bottoms.items())), kicks)
+
+
+def build_rotation_states(tetromino_type: str) -> tuple:
+    # The four orientations of a tetromino, each a quarter turn clockwise from the last
+    binary_matrix = tetrominos[tetromino_type]
+    origin = rotation_origins[tetromino_type]
+    cells = [(col - origin[0], row - origin[1])
+             for row in range(len(binary_matrix)) for col in range(len(binary_matrix))
+             if binary_matrix[row][col] == 1]
+    kicks = [NO_KICKS] * 4
+    if WALL_KICKS and tetromino_type != 'O':
+        kicks = SRS_I_KICKS if tetromino_type == 'I' else SRS_KICKS
+    orientations = []
+    for rotation in range(4):
+        orientations.append(build_orientation(cells, kicks[rotation]))
+        # The square piece looks the same in every orientation
+        if tetromino_type != 'O':
+            # Rotate the coordinates by translating (x, y) to (-y, x)
+            cells = [(-row, column) for column, row in cells]
+    return tuple(orientations)
+
+
+# Every orientation of every tetromino type, and the board cell each type spawns rotating around
+ROTATION_STATES = {tetromino_type: build_rotation_states(tetromino_type) for tetromino_type in tetrominos}
+SPAWN_ORIGINS = {tetromino_type: (SPAWN_POSITION[0] + origin[0], SPAWN_POSITION[1] + origin[1])
+                 for tetromino_type, origin in rotation_origins.items()}
 
 
-def matrix_to_tiles(binary_matrix, color):
-    tile_group = []
-    for row in range(len(binary_matrix)):
-        for col in range(len(binary_matrix)):
-            binary = binary_matrix[row][col]
-            if binary == 1:
-                coordinates = list(DEFAULT_POSITIONS[row][col])
-                tile_position = [LEFT_BOUND - TILE_SIZE + coordinates[0] * TILE_SIZE, coordinates[1] * TILE_SIZE]
-                tile_group.append(Tile(color, tile_position))
-    return tile_group
+def get_shadow_color(color: tuple) -> tuple:
+    # The dimmed color of a tetromino's shadow
+    return int(0.5 * color[0]), int(0.5 * color[1]), int(0.5 * color[2])
 
 
-def get_default_origin(tetromino_type: str) -> list[int]:
-    # The square piece cannot rotate.
-    if tetromino_type == 'O':
-        return [0, 0]
-    # The aqua-colored straight piece has a special rotation point in between its middle tiles
-    if tetromino_type == 'I':
-        return [416, 96]
-    # Every other tetromino type has the same default origin because they're 3x3
-    return [384, 96]
+SHADOW_COLORS = {tetromino_type: get_shadow_color(color) for tetromino_type, color in tetromino_colors.items()}
 
 
 class Tetromino:
-    def __init__(self, tetromino_type: str, binary_matrix: list[list[int]]):
-        self.origin_cords = get_default_origin(tetromino_type)
+    __slots__ = ('type', 'color', 'shadow_color', 'rotation_states', 'is_placed', 'rotation', 'x', 'y')
+
+    def __init__(self, tetromino_type: str):
+        self.respawn(tetromino_type)
+
+    def respawn(self, tetromino_type: str) -> None:
+        # Become a new tetromino of the given type at the spawn position, so that a placed
+        # tetromino can be reused instead of making another
         # Color and Type
         self.type = tetromino_type
         self.color = tetromino_colors[tetromino_type]
-        # The current binary matrix representing the tile_group
-        self.binary_matrix = binary_matrix
-        # The arrangement of the tetrominos tiles
-        self.tile_group = matrix_to_tiles(binary_matrix, self.color)
+        # The color of the shadow showing the player where the piece will drop
+        self.shadow_color = SHADOW_COLORS[tetromino_type]
+        self.rotation_states = ROTATION_STATES[tetromino_type]
         self.is_placed = False  # Tetromino is placed (retired)
-        # Timer spent touching the ground
-        self.timer = 0
-
-        # The shadow tetromino showing the player where the piece will drop
-        self.shadow = copy.deepcopy(self)
-        self.shadow.color = (int(0.5 * self.color[0]),
-                             int(0.5 * self.color[1]),
-                             int(0.5 * self.color[2]))
-
-    def draw(self, screen) -> None:
-        for tile in self.tile_group:
-            pygame.draw.rect(screen, self.color, tile.rect)
-
-    def update(self) -> None:
-        # Update all the tiles in the tetromino
-        for tile in self.tile_group:
-            tile.update()
-
-    def rotate(self, placed_tiles=()) -> None:
-        # Create a list of new rotated positions for each tile
-        rotated_positions = []
-        for tile in self.tile_group:
-            # Get the tile's (x, y) coordinates relative to the designated origin
-            origin_pos = [tile.position[0] - self.origin_cords[0], tile.position[1] - self.origin_cords[1]]
-            # Rotate the coordinates by translating (x, y) to (-y, x)
-            rotated_positions.append([-origin_pos[1] + self.origin_cords[0], origin_pos[0] + self.origin_cords[1]])
-        can_rotate = True
-
-        # Check that the tetromino rotation does not go out of bounds or interfere with other tiles
-        for new_position in rotated_positions:
-            # Check that each tile is within bounds after rotation
-            if new_position[0] < LEFT_BOUND or new_position[0] > RIGHT_BOUND or new_position[1] < UPPER_BOUND or new_position[1] > LOWER_BOUND:
-                can_rotate = False
-                break
-            # Check that each tile in the tetromino won't overlap with an existing tile
-            for placed_tile in placed_tiles:
-                if new_position == placed_tile.position:
-                    can_rotate = False
-                    break
-        # Set the coordinates of each tile to the new rotated coordinates
-        if can_rotate:
-            for index in range(len(self.tile_group)):
-                self.tile_group[index].position = rotated_positions[index]
-                self.tile_group[index].update()
+        self.reset()
+
+    def reset(self) -> None:
+        # Move back to the spawn position and orientation
+        self.rotation = 0
+        self.x, self.y = SPAWN_ORIGINS[self.type]
+
+    @property
+    def orientation(self) -> Orientation:
+        return self.rotation_states[self.rotation]
+
+    def cells(self) -> list[tuple[int, int]]:
+        # The (column, row) board cells covered by the tetromino
+        return [(self.x + column, self.y + row) for column, row in self.orientation.cells]
+
+    def fits(self, board, x: int, y: int, rotation=None) -> bool:
+        # Check that the tetromino would be within bounds and clear of placed tiles
+        orientation = self.orientation if rotation is None else self.rotation_states[rotation]
+        return board.fits(orientation, x, y)
+
+    def rotate(self, board) -> bool:
+        rotation = (self.rotation + 1) % 4
+        for offset_x, offset_y in self.orientation.kicks:
+            if self.fits(board, self.x + offset_x, self.y + offset_y, rotation):
+                self.rotation = rotation
+                self.x += offset_x
+                self.y += offset_y
+                return True
+        return False
 
     def place_tetromino(self):
         self.is_placed = True
-        for tile in self.tile_group:
-            tile.is_placed = True
-
-    def can_move_down(self, placed_tiles=()) -> bool:
-        # Check for collisions with placed tiles
-        for tile in self.tile_group:
-            for placed_tile in placed_tiles:
-                # If a placed tile shares the same x with a y equal to y + TILE_SIZE, it is below the current.
-                if tile.position[1] + TILE_SIZE == placed_tile.position[1] and tile.position[0] == placed_tile.position[
-                    0]:
-                    return False
-        # Check lower bound
-        for tile in self.tile_group:
-            if tile.position[1] + TILE_SIZE > LOWER_BOUND:
-                return False
-        return True
-
-    def move_down(self, placed_tiles=(), check_bound=True) -> None:
+
+    def can_move_down(self, board) -> bool:
+        return self.fits(board, self.x, self.y + 1)
+
+    def move_down(self, board=None, check_bound=True) -> None:
         # Move tetromino down if possible
-        if self.can_move_down(placed_tiles) or not check_bound:
-            self.origin_cords[1] += TILE_SIZE
-            for tile in self.tile_group:
-                tile.move_down(placed_tiles, check_bound)
+        if not check_bound or self.can_move_down(board):
+            self.y += 1
         else:
             self.place_tetromino()
 
-    def move_left(self, placed_tiles=(), check_bound=True):
-        can_move_left = True
-        # Check for leftward placed tiles
-        for tile in self.tile_group:
-            for placed_tile in placed_tiles:
-                if tile.position[0] - TILE_SIZE == placed_tile.position[0] and tile.position[1] == placed_tile.position[
-                    1]:
-                    can_move_left = False
-                    break
-        # Check left bound
-        for tile in self.tile_group:
-            if check_bound and tile.position[0] - TILE_SIZE < LEFT_BOUND:
-                can_move_left = False
-        # Move each tile leftward
-        if can_move_left:
-            self.origin_cords[0] -= TILE_SIZE
-            for tile in self.tile_group:
-                tile.move_left(check_bound)
-
-    def move_right(self, placed_tiles=(), check_bound=True):
-        can_move_right = True
-        # Check for rightward placed tiles
-        for tile in self.tile_group:
-            for placed_tile in placed_tiles:
-                if tile.position[0] + TILE_SIZE == placed_tile.position[0] and tile.position[1] == placed_tile.position[
-                    1]:
-                    can_move_right = False
-        # Check right bound
-        for tile in self.tile_group:
-            if check_bound and tile.position[0] + TILE_SIZE > RIGHT_BOUND:
-                can_move_right = False
-        # Move each tile rightward
-        if can_move_right:
-            self.origin_cords[0] += TILE_SIZE
-            for tile in self.tile_group:
-                tile.move_right(check_bound)
+    def drop_distance(self, board) -> int:
+        # How many rows the tetromino can fall before it lands
+        return board.drop_distance(self.orientation, self.x, self.y)
+
+    def ghost_cells(self, board) -> list[tuple[int, int]]:
+        # The cells the tetromino would cover if it was dropped
+        distance = self.drop_distance(board)
+        return [(column, row + distance) for column, row in self.cells()]
+
+    def hard_drop(self, board) -> None:
+        # Move the tetromino straight to where it lands and place it
+        self.y += self.drop_distance(board)
+        self.place_tetromino()
+
+    def move_left(self, board=None, check_bound=True):
+        if not check_bound or self.fits(board, self.x - 1, self.y):
+            self.x -= 1
+
+    def move_right(self, board=None, check_bound=True):
+        if not check_bound or self.fits(board, self.x + 1, self.y):
+            self.x += 1
@@ -0,0 +1,138 @@
+import argparse
+import json
+import multiprocessing
+import os
+import random
+import statistics
+import sys
+import time
+
+from constants import *
+from game_state import *
+from profiler import percentile
+from randomizer import PREVIEW_LENGTH, RANDOMIZERS
+from search import DEFAULT_BEAM_WIDTH, DEFAULT_DEPTH, Bot, PlacementSearch, Weights, play_game
+
+# Policies a tournament can run, see make_policy
+POLICIES = ('search', 'random')
+
+# The tournament settings, handed to each worker process when it starts
+worker_settings = None
+
+
+class RandomPolicy:
+    # Presses random keys, mostly waiting
+    def __init__(self, seed=None):
+        self.rng = random.Random(seed)
+
+    def act(self, state) -> int:
+        return self.rng.choice(RANDOM_ACTIONS)
+
+
+def make_policy(settings: dict, seed: int):
+    if settings['policy'] == 'search':
+        return Bot(PlacementSearch(Weights(*settings['weights']), beam_width=settings['beam'],
+                                   depth=settings['depth']))
+    return RandomPolicy(seed)
+
+
+def start_worker(settings: dict) -> None:
+    global worker_settings
+    worker_settings = settings
+
+
+def run_game(game: tuple[int, int]) -> dict:
+    # Play one game in a worker and describe how it went
+    number, seed = game
+    settings = worker_settings
+    start = time.perf_counter()
+    state, lines = play_game(make_policy(settings, seed), seed, settings['dt'], settings['max_pieces'],
+                             Gravity(*settings['gravity']), settings['action_delay'], settings['randomizer'],
+                             settings['preview'])
+    return {
+        'game': number,
+        'seed': seed,
+        'score': state.score,
+        'lines': lines,
+        'pieces': state.tetrominos_placed,
+        'game_over': state.game_over,
+        'game_seconds': round(state.time_elapsed / 1000, 3),
+        'wall_seconds': round(time.perf_counter() - start, 4),
+        'worker': os.getpid(),
+    }
+
+
+def summarize(results: list[dict], wall_seconds: float) -> dict:
+    scores = [result['score'] for result in results]
+    return {
+        'games': len(results),
+        'games_per_second': round(len(results) / wall_seconds, 2),
+        'score_mean': round(statistics.fmean(scores), 2),
+        'score_stdev': round(statistics.pstdev(scores), 2),
+        'score_p10': percentile(scores, 0.1),
+        'score_median': percentile(scores, 0.5),
+        'score_p90': percentile(scores, 0.9),
+        'score_max': max(scores),
+        'lines_mean': round(statistics.fmean(result['lines'] for result in results), 2),
+        'pieces_mean': round(statistics.fmean(result['pieces'] for result in results), 2),
+        'game_seconds_mean': round(statistics.fmean(result['game_seconds'] for result in results), 2),
+        'topped_out': sum(result['game_over'] for result in results),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Play many headless games across processes and collect the results')
+    parser.add_argument('--games', type=int, default=100)
+    parser.add_argument('--workers', type=int, default=os.cpu_count())
+    parser.add_argument('--seed', type=int, default=0, help='game n is played with seed + n')
+    parser.add_argument('--output', default='-', help='JSON lines file for the results of every game (- for stdout)')
+    parser.add_argument('--policy', choices=POLICIES, default='search')
+    parser.add_argument('--beam', type=int, default=DEFAULT_BEAM_WIDTH, help='beam width of the search policy')
+    parser.add_argument('--depth', type=int, default=DEFAULT_DEPTH,
+                        help='tetrominos the search policy places ahead (0 for the whole preview)')
+    parser.add_argument('--weights', type=float, nargs=4, default=list(Weights()),
+                        metavar=('HEIGHT', 'HOLES', 'BUMPINESS', 'SCORE'), help='search heuristic weights')
+    parser.add_argument('--gravity', type=float, nargs=3, default=list(Gravity()), metavar=('BASE', 'MINIMUM', 'RAMP'),
+                        help='milliseconds per row at the start, the fastest it gets and the speed up per point')
+    parser.add_argument('--randomizer', choices=RANDOMIZERS, default='uniform', help='how tetrominos are chosen')
+    parser.add_argument('--preview', type=int, default=PREVIEW_LENGTH, help='upcoming tetrominos shown')
+    parser.add_argument('--dt', type=float, default=SIMULATION_STEP, help='milliseconds per step')
+    parser.add_argument('--action-delay', type=int, default=0, help='idle steps after every action')
+    parser.add_argument('--max-pieces', type=int, default=1000, help='end games after this many tetrominos')
+    args = parser.parse_args()
+
+    settings = {
+        'policy': args.policy,
+        'beam': args.beam,
+        'depth': args.depth or None,
+        'weights': args.weights,
+        'gravity': args.gravity,
+        'randomizer': args.randomizer,
+        'preview': args.preview,
+        'dt': args.dt,
+        'action_delay': args.action_delay,
+        'max_pieces': args.max_pieces,
+    }
+    games = [(number, args.seed + number) for number in range(args.games)]
+    output = sys.stdout if args.output == '-' else open(args.output, 'w')
+    results = []
+    start = time.perf_counter()
+    try:
+        with multiprocessing.Pool(args.workers, start_worker, (settings,)) as pool:
+            # Write each result as soon as its game ends
+            chunk_size = max(1, len(games) // (args.workers * 32))
+            for result in pool.imap_unordered(run_game, games, chunk_size):
+                results.append(result)
+                output.write(json.dumps(result) + '\n')
+                output.flush()
+    finally:
+        if output is not sys.stdout:
+            output.close()
+    if not results:
+        return
+    summary = summarize(results, time.perf_counter() - start)
+    print(json.dumps({'settings': settings, 'summary': summary}, indent=2), file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
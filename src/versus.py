@@ -0,0 +1,256 @@
+import itertools
+import math
+import random
+import time
+from collections import deque
+
+import pygame
+
+from pygame.locals import *
+
+from constants import *
+from assets import blit_glyphs, render_text
+from controls import KeyRepeater
+from game_state import *
+from profiler import PROFILE_WINDOW, percentile
+from renderer import StackLayer, draw_cells, draw_tetromino
+from scenes import GameOverScene, Scene
+from search import Bot, PlacementSearch
+from sprites import get_piece_sprite
+
+# Garbage lines sent for clearing 1, 2, 3 or 4 lines at once
+ATTACK_LINES = {1: 0, 2: 1, 3: 2, 4: 4}
+# Steps a bot waits between its actions (100 ms at the simulation rate)
+BOT_ACTION_DELAY = 12
+# Searches the bots may start in one frame, the others wait for the next frames
+BOT_SEARCHES_PER_FRAME = 1
+# How often the per-board frame times shown are refreshed (milliseconds)
+METRICS_INTERVAL = 500
+# Board views: tiles of space beside the board for the held and upcoming tetrominos, the
+# upcoming tetrominos shown and the size and lines of the text above the board
+VIEW_SIDE_TILES = 5
+VIEW_PREVIEWS = 3
+VIEW_FONT_SIZE = 12
+VIEW_TEXT_LINES = 2
+VIEW_MARGIN = 4
+VIEW_BACKGROUND = (40, 40, 40)
+
+
+def make_bot() -> Bot:
+    # The cheapest search, so that many bots fit in a frame
+    return Bot(PlacementSearch(beam_width=1, depth=1))
+
+
+class Player:
+    # One board of a match: its game, the bot playing it (None for the keyboard) and how much of
+    # every frame the board took to simulate and draw
+    def __init__(self, state, bot=None):
+        self.state = state
+        self.bot = bot
+        self.idle_steps = 0
+        self.lines_sent = 0
+        self.games = 1
+        self.frame_time = 0
+        self.frame_times = deque(maxlen=PROFILE_WINDOW)
+        self.metrics = ''
+
+    def end_frame(self) -> None:
+        self.frame_times.append(self.frame_time)
+        self.frame_time = 0
+
+    def update_metrics(self) -> None:
+        if self.frame_times:
+            times = list(self.frame_times)
+            self.metrics = f'{percentile(times, 0.5) * 1000:.2f}/{percentile(times, 0.99) * 1000:.2f} ms'
+
+
+class Match:
+    # Games played side by side, where clearing lines sends garbage to a random opponent
+    def __init__(self, players, seed=None, garbage=True):
+        self.players = players
+        self.rng = random.Random(seed)
+        self.garbage = garbage
+
+    def alive(self) -> list[Player]:
+        return [player for player in self.players if not player.state.game_over]
+
+    def cleared(self, player: Player, lines: int) -> None:
+        # Cancel the player's own pending garbage with the lines it cleared and send what is left
+        if not self.garbage or not lines:
+            return
+        attack = player.state.cancel_garbage(ATTACK_LINES[lines])
+        targets = [opponent for opponent in self.alive() if opponent is not player]
+        if not attack or not targets:
+            return
+        target = self.rng.choice(targets)
+        target.state.queue_garbage(attack, self.rng.randrange(target.state.board.columns))
+        player.lines_sent += attack
+
+
+def grid_layout(count: int, area: pygame.Rect, columns: int = BOARD_COLUMNS, rows: int = BOARD_ROWS) -> list:
+    # Split the area into equal viewports for the boards, in the arrangement that gives the largest tiles
+    best = None
+    for grid_columns in range(1, count + 1):
+        grid_rows = math.ceil(count / grid_columns)
+        width, height = area.w // grid_columns, area.h // grid_rows
+        size = view_tile_size(pygame.Rect(0, 0, width, height), columns, rows)
+        if best is None or size > best[0]:
+            best = (size, grid_columns, width, height)
+    size, grid_columns, width, height = best
+    return [pygame.Rect(area.x + index % grid_columns * width, area.y + index // grid_columns * height, width, height)
+            for index in range(count)]
+
+
+def view_tile_size(rect: pygame.Rect, columns: int = BOARD_COLUMNS, rows: int = BOARD_ROWS) -> int:
+    text_height = VIEW_TEXT_LINES * (VIEW_FONT_SIZE + 2)
+    return max(1, min((rect.w - 2 * VIEW_MARGIN) // (columns + VIEW_SIDE_TILES),
+                      (rect.h - 2 * VIEW_MARGIN - text_height) // rows))
+
+
+class BoardView:
+    # Draws one game scaled into a viewport of the screen, only when something on it changed
+    def __init__(self, screen, rect, columns: int = BOARD_COLUMNS, rows: int = BOARD_ROWS):
+        self.screen = screen
+        self.rect = pygame.Rect(rect)
+        self.tile_size = size = view_tile_size(self.rect, columns, rows)
+        text_height = VIEW_TEXT_LINES * (VIEW_FONT_SIZE + 2)
+        self.text_position = (self.rect.x + VIEW_MARGIN, self.rect.y + VIEW_MARGIN)
+        self.board_origin = (self.rect.x + VIEW_MARGIN, self.rect.y + VIEW_MARGIN + text_height)
+        self.board_rect = pygame.Rect(self.board_origin, (columns * size, rows * size))
+        self.held_position = (self.board_rect.right + size, self.board_rect.y)
+        self.upcoming_position = (self.board_rect.right + size, self.board_rect.y + 3 * size)
+        self.stack = StackLayer(columns, rows, size)
+        # Everything that never changes, drawn once
+        self.background = pygame.surface.Surface(self.rect.size, 0, 32)
+        self.background.fill(VIEW_BACKGROUND)
+        self.background.fill(BLACK, self.board_rect.move(-self.rect.x, -self.rect.y))
+        self.drawn = None
+
+    def draw(self, player: Player) -> pygame.Rect | None:
+        # Draw the board if it changed since the last time, returning the rect to update
+        state = player.state
+        current = state.current_tetromino
+        held_type = state.held_tetromino and state.held_tetromino.type
+        upcoming = tuple(itertools.islice(state.preview, VIEW_PREVIEWS))
+        pending = sum(lines for lines, hole in state.pending_garbage)
+        contents = (state.board.zobrist, state.tetrominos_placed, current.type, current.rotation, current.x,
+                    current.y, held_type, upcoming, pending, state.score, state.game_over, player.metrics)
+        if contents == self.drawn:
+            return None
+        self.drawn = contents
+        size = self.tile_size
+        self.screen.blit(self.background, self.rect)
+        self.stack.update(state.board, state.tetrominos_placed)
+        self.stack.blit(self.screen, self.board_origin)
+        if not state.game_over:
+            draw_cells(self.screen, current.ghost_cells(state.board), current.shadow_color, self.board_origin, size)
+            draw_tetromino(self.screen, current, self.board_origin, size)
+        # Garbage on its way, as a bar along the left of the board
+        if pending:
+            height = min(pending, state.board.rows) * size
+            self.screen.fill(RED, (self.board_rect.x, self.board_rect.bottom - height, max(1, size // 4), height))
+        if held_type is not None:
+            self.screen.blit(get_piece_sprite(held_type, size=size), self.held_position)
+        x, y = self.upcoming_position
+        for tetromino_type in upcoming:
+            self.screen.blit(get_piece_sprite(tetromino_type, size=size), (x, y))
+            y += 3 * size
+        # Score, lines sent and this board's share of the frame
+        x, y = self.text_position
+        x = blit_glyphs(self.screen, str(state.score), (x, y), VIEW_FONT_SIZE, WHITE)
+        blit_glyphs(self.screen, f' sent {player.lines_sent}', (x, y), VIEW_FONT_SIZE, WHITE)
+        blit_glyphs(self.screen, player.metrics, (self.text_position[0], y + VIEW_FONT_SIZE + 2), VIEW_FONT_SIZE,
+                    WHITE)
+        if state.game_over:
+            text = render_text('TOPPED OUT', VIEW_FONT_SIZE, WHITE)
+            self.screen.blit(text, text.get_rect(center=self.board_rect.center))
+        return self.rect
+
+
+class VersusScene(Scene):
+    # Several games in one window. Versus: the keyboard plays the first board against bots and
+    # the match ends when it tops out or is the last one standing. Spectating: bots play every
+    # board and a board that tops out starts over.
+    def __init__(self, screen, high_score=0, boards: int = 2, human=True, seed=None, garbage=True):
+        super().__init__(screen, high_score)
+        self.human = human
+        # Versus boards share a seed so that everybody gets the same tetrominos
+        self.seed = random.randrange(1 << 63) if seed is None else seed
+        players = [Player(GameState(self.seed if human else self.seed + number),
+                          None if human and number == 0 else make_bot())
+                   for number in range(boards)]
+        self.match = Match(players, self.seed, garbage)
+        self.views = [BoardView(screen, rect) for rect in grid_layout(boards, screen.get_rect())]
+        self.input = KeyRepeater()
+        # Game time simulated so far, and time that has passed but not been simulated yet (milliseconds)
+        self.time = 0
+        self.unsimulated_time = 0
+        self.metrics_timer = 0
+        self.drawn = False
+
+    def handle_event(self, event) -> None:
+        if self.human:
+            self.input.handle_event(event, self.time)
+
+    def update(self, dt: float) -> None:
+        self.unsimulated_time += min(dt, MAX_FRAME_TIME)
+        searches = BOT_SEARCHES_PER_FRAME
+        while self.unsimulated_time >= SIMULATION_STEP:
+            self.unsimulated_time -= SIMULATION_STEP
+            self.time += SIMULATION_STEP
+            for player in self.match.players:
+                start = time.perf_counter()
+                searches -= self.step_player(player, searches > 0)
+                player.frame_time += time.perf_counter() - start
+        self.metrics_timer += dt
+        if self.metrics_timer >= METRICS_INTERVAL:
+            self.metrics_timer = 0
+            for player in self.match.players:
+                player.update_metrics()
+        if self.human:
+            you = self.match.players[0]
+            if you.state.game_over or len(self.match.alive()) <= 1:
+                self.next_scene = GameOverScene(self.screen, you.state, max(self.high_score, you.state.score))
+
+    def step_player(self, player: Player, can_search: bool) -> bool:
+        # Advance one board by a step, returning whether its bot searched
+        state = player.state
+        if state.game_over:
+            if self.human:
+                return False
+            # Start the board over, with a fresh bot
+            player.state = GameState(random.randrange(1 << 63))
+            player.bot = make_bot()
+            player.games += 1
+            return False
+        searched = False
+        if player.bot is None:
+            # The keys due by the end of the step (self.time has already moved on to it)
+            self.input.run_step(state, self.time,
+                                lambda action, dt: self.match.cleared(player, state.step(action, dt)))
+            return searched
+        if player.idle_steps > 0 or (player.bot.needs_plan(state) and not can_search):
+            # Between actions, or waiting for a turn to search
+            player.idle_steps -= 1
+            action = NO_OP
+        else:
+            searched = player.bot.needs_plan(state)
+            action = player.bot.act(state)
+            player.idle_steps = BOT_ACTION_DELAY
+        self.match.cleared(player, state.step(action, SIMULATION_STEP))
+        return searched
+
+    def draw(self) -> list[pygame.Rect]:
+        dirty = []
+        if not self.drawn:
+            self.drawn = True
+            self.screen.fill(BLACK)
+            dirty.append(self.screen.get_rect())
+        for player, view in zip(self.match.players, self.views):
+            start = time.perf_counter()
+            rect = view.draw(player)
+            player.frame_time += time.perf_counter() - start
+            player.end_frame()
+            if rect is not None:
+                dirty.append(rect)
+        return dirty